@@ -1,10 +1,36 @@
 import streamlit as st
+from app_utils import show_budget_alerts, session_ledgers, ledger_dir, DEFAULT_LEDGER_ID
 
 # Page config
 st.set_page_config(page_title="Personal Finance Assistance", page_icon="📝", layout="centered")
 
 # Title and intro
 st.title('📝 Personal Finance Assistance')
+
+# Ledger profile of this session: every profile has its own transactions and budget.
+# Only the profiles this session opened are listed; another profile is opened by its name.
+OPEN_PROFILE_OPTION = "➕ Buka atau buat profil"
+ledgers = session_ledgers()
+current_ledger = st.session_state.get("ledger_id", DEFAULT_LEDGER_ID)
+selected_ledger = st.selectbox(
+    "Profil Buku Kas", ledgers + [OPEN_PROFILE_OPTION],
+    index=ledgers.index(current_ledger) if current_ledger in ledgers else 0
+)
+if selected_ledger == OPEN_PROFILE_OPTION:
+    new_ledger = st.text_input("Nama profil (huruf, angka, - atau _)")
+    if new_ledger:
+        try:
+            ledger_dir(new_ledger)
+            st.session_state.ledger_id = new_ledger
+            st.rerun()
+        except ValueError as e:
+            st.error(str(e))
+else:
+    st.session_state.ledger_id = selected_ledger
+
+# Budget alerts of the current month
+show_budget_alerts()
+
 st.write("""
 Selamat datang di Personal Finance Assistance! 
          Aplikasi ini dirancang untuk membantu Anda mengelola keuangan pribadi dengan lebih baik.
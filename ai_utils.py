@@ -0,0 +1,236 @@
+# Import necessary libraries
+import os
+import json
+import time
+import random
+import hashlib
+import sqlite3
+import threading
+
+from app_utils import DATA_DIR, get_requests
+
+# Chat completion endpoint (OpenRouter by default, any OpenAI-compatible URL works)
+OPENROUTER_URL = os.environ.get("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
+LLM_MODEL = "deepseek/deepseek-chat-v3-0324"
+
+# Seconds to wait for the connection and for the response
+LLM_CONNECT_TIMEOUT = 5
+LLM_READ_TIMEOUT = 90
+
+# Retries for connection errors, timeouts and these status codes, with jittered exponential backoff
+LLM_MAX_RETRIES = 3
+LLM_BACKOFF_SECONDS = 0.5
+LLM_BACKOFF_MAX_SECONDS = 8
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Responses are cached on disk for LLM_CACHE_TTL_SECONDS, keeping the LLM_CACHE_MAX_ENTRIES most recently used
+LLM_CACHE_PATH = os.path.join(DATA_DIR, "llm_cache.db")
+LLM_CACHE_TTL_SECONDS = 7 * 24 * 3600
+LLM_CACHE_MAX_ENTRIES = 500
+
+# Raised when the endpoint fails after all retries or answers with a non-retryable status
+class LLMError(Exception):
+    def __init__(self, message, status_code=None, text=""):
+        super().__init__(message)
+        self.status_code = status_code
+        self.text = text
+
+# Function to normalize a prompt (whitespace) so equivalent prompts share a cache entry
+def normalize_prompt(text):
+    return " ".join(str(text).split())
+
+# Function to get the cache key of a request: hash of the endpoint, model and normalized messages
+def prompt_key(url, model, messages):
+    normalized = [{"role": m["role"], "content": normalize_prompt(m["content"])} for m in messages]
+    payload = json.dumps({"url": url, "model": model, "messages": normalized}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# Persistent response cache in SQLite with a time-to-live and least-recently-used eviction
+class ResponseCache:
+    def __init__(self, path=LLM_CACHE_PATH, ttl=LLM_CACHE_TTL_SECONDS, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    # Cached response for key, or None if missing or expired
+    def get(self, key):
+        now = time.time()
+        with self.lock, self._connect() as conn:
+            row = conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.stats["misses"] += 1
+                return None
+            conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.stats["hits"] += 1
+            return row[0]
+
+    # Store a response and evict expired and least recently used entries
+    def put(self, key, response):
+        now = time.time()
+        with self.lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, response, now, now))
+            conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            conn.execute(
+                "DELETE FROM responses WHERE key NOT IN "
+                "(SELECT key FROM responses ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+
+    def clear(self):
+        with self.lock, self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+# One pooled HTTP session per process, so repeated calls reuse their connection
+_session = None
+_session_lock = threading.Lock()
+
+# Function to get the shared requests.Session
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            requests = get_requests()
+            _session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+# Chat completion client with timeouts, retries and the response cache
+class LLMClient:
+    def __init__(self, api_key, url=OPENROUTER_URL, model=LLM_MODEL, cache=None,
+                 timeout=(LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT), max_retries=LLM_MAX_RETRIES,
+                 backoff=LLM_BACKOFF_SECONDS):
+        self.api_key = api_key
+        self.url = url
+        self.model = model
+        self.cache = cache
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def _headers(self):
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": "https://personal-finance-assistance.streamlit.app"
+        }
+
+    # Seconds to wait before retry number attempt (full jitter, capped)
+    def _backoff_delay(self, attempt):
+        return random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, self.backoff * 2 ** attempt))
+
+    # POST with retries; returns the successful response
+    def _post(self, data, stream=False):
+        requests = get_requests()
+        session = get_session()
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self._backoff_delay(attempt - 1))
+            try:
+                response = session.post(self.url, headers=self._headers(), json=data,
+                                        timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                last_error = LLMError(f"Request failed: {e}")
+                continue
+            except requests.RequestException as e:
+                # Not transient (invalid URL, too many redirects, ...): no retry
+                raise LLMError(f"Request failed: {e}")
+            if response.status_code == 200:
+                return response
+            # The error body is read and the response closed, so its connection goes back to
+            # the pool instead of staying half-read
+            try:
+                last_error = LLMError(f"Status code {response.status_code}", response.status_code, response.text)
+            except requests.RequestException as e:
+                last_error = LLMError(f"Status code {response.status_code}: {e}", response.status_code)
+            finally:
+                response.close()
+            if response.status_code not in RETRY_STATUS_CODES:
+                break
+        raise last_error
+
+    # Reply to a single user prompt (from the cache when the same prompt was answered before)
+    def chat(self, prompt):
+        messages = [{"role": "user", "content": prompt}]
+        key = prompt_key(self.url, self.model, messages)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        response = self._post({"model": self.model, "messages": messages})
+        try:
+            content = response.json()["choices"][0]["message"]["content"]
+        except (ValueError, KeyError, IndexError, TypeError):
+            raise LLMError("Unexpected response", response.status_code, response.text)
+        finally:
+            response.close()
+        if self.cache is not None:
+            self.cache.put(key, content)
+        return content
+
+    # Reply to a single user prompt as a stream of text pieces (server-sent events).
+    # A cached reply is yielded at once; a streamed reply is cached once it is complete.
+    def chat_stream(self, prompt):
+        messages = [{"role": "user", "content": prompt}]
+        key = prompt_key(self.url, self.model, messages)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        response = self._post({"model": self.model, "messages": messages, "stream": True}, stream=True)
+        response.encoding = "utf-8"
+        pieces = []
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                # Blank lines separate events; lines starting with ":" are keep-alive comments
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    event = json.loads(data)
+                except ValueError:
+                    continue
+                if "error" in event:
+                    raise LLMError(str(event["error"]), response.status_code, data)
+                choices = event.get("choices") or [{}]
+                piece = (choices[0].get("delta") or {}).get("content")
+                if piece:
+                    pieces.append(piece)
+                    yield piece
+        except get_requests().RequestException as e:
+            raise LLMError(f"Stream interrupted: {e}")
+        finally:
+            response.close()
+        if self.cache is not None and pieces:
+            self.cache.put(key, "".join(pieces))
+
+# Shared response cache (created on first use)
+_cache = None
+
+# Function to get a client for the configured endpoint that uses the shared response cache
+def get_llm_client(api_key, url=None):
+    global _cache
+    with _session_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+    return LLMClient(api_key, url=url or OPENROUTER_URL, cache=_cache)
@@ -5,11 +5,37 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import streamlit as st
 import pandas as pd
-import requests
+import numpy as np
 import re
-from transformers import pipeline
-import json
-import matplotlib.pyplot as plt
+import time
+import bisect
+import threading
+import importlib.util
+import io
+import uuid
+import contextlib
+import sqlite3
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import fcntl
+except ImportError:
+    # No advisory file locks (Windows): writes are only serialized within this process
+    fcntl = None
+
+from categorizer import TransactionCategorizer
+
+# Heavy optional dependencies are imported on first use instead of when a page imports app_utils
+
+# Function to get the requests module
+def get_requests():
+    import requests
+    return requests
+
+# Function to get the transformers pipeline factory
+def get_transformers_pipeline():
+    from transformers import pipeline
+    return pipeline
 
 # Data Directory
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -21,30 +47,1365 @@ expected_cols = [
     "Sub-kategori", "Metode Pembayaran", "Catatan"
 ]
 
+# Ledger partitions: every user or profile has its own ledger directory with its own
+# files, caches and aggregates. The default ledger stays in DATA_DIR itself.
+LEDGERS_DIR = os.path.join(DATA_DIR, "ledgers")
+DEFAULT_LEDGER_ID = "default"
+ledger_id_pattern = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+# Whether the profile selector lists every ledger on disk. Off by default: a session only
+# sees the profiles it opened itself (by name), not those of other households.
+LIST_ALL_LEDGERS = os.environ.get("LIST_ALL_LEDGERS", "0") == "1"
+
+# Open ledgers kept in memory: at most MAX_OPEN_LEDGERS (least recently used are closed
+# first), and none that has not been used for LEDGER_IDLE_SECONDS
+MAX_OPEN_LEDGERS = int(os.environ.get("MAX_OPEN_LEDGERS", 8))
+LEDGER_IDLE_SECONDS = 30 * 60
+
+# Cached values (parsed ledger, figures, reviews, ...) kept per ledger
+STORE_CACHE_MAX_ENTRIES = 32
+
+# Number of journal rows that triggers a compaction into the base file
+JOURNAL_COMPACT_ROWS = 1000
+
+# Saves cutting the ledger at more positions than this (inserted dates and deleted
+# rows) merge with one take over the whole ledger instead of concatenating slices
+MERGE_MAX_SLICES = 64
+
+# Number of uploaded CSV rows parsed and validated at a time
+IMPORT_CHUNK_ROWS = 50000
+
+# Number of background threads running CSV imports
+IMPORT_WORKERS = 2
+
+# Storage backend for the base ledger file: "arrow" (memory-mapped Arrow IPC), "csv"
+# or "sqlite" (indexed SQLite database, changes are written in place instead of to the journal)
+LEDGER_BACKEND = os.environ.get("LEDGER_BACKEND", "arrow")
+
+# Stable row id stored with every transaction (the index of the cached ledger)
+id_col = "ID"
+# Journal layout: every line is one "add", "update" or "delete" of a row id
+journal_cols = ["op", id_col] + expected_cols
+
+# Fixed ledger dtypes (Tanggal is always datetime64)
+categorical_cols = ["Kategori", "Sub-kategori", "Metode Pembayaran"]
+text_cols = ["Deskripsi", "Catatan"]
+
+# Function to apply the fixed ledger dtypes
+def apply_ledger_dtypes(df, strict=False):
+    df["Jumlah (Rp)"] = pd.to_numeric(df["Jumlah (Rp)"], errors="raise" if strict else "coerce").astype("float64")
+    for col in text_cols:
+        df[col] = df[col].fillna("").astype(str)
+    for col in categorical_cols:
+        df[col] = df[col].astype("category")
+    return df
+
+# Function to bring a transaction DataFrame into the ledger layout (columns, dtypes, order)
+def normalize_ledger(df, strict=False):
+    if df is None or df.empty:
+        df = pd.DataFrame(columns=expected_cols)
+    df = df.copy()
+
+    # Ensure all expected columns exist and keep them in the expected order
+    for col in expected_cols:
+        if col not in df.columns:
+            df[col] = ""
+    df = df[expected_cols]
+
+    # Saving keeps failing loudly on bad dates, loading silently drops them
+    if strict:
+        df["Tanggal"] = pd.to_datetime(df["Tanggal"])
+    else:
+        df["Tanggal"] = pd.to_datetime(df["Tanggal"], errors="coerce")
+        df = df.dropna(subset=["Tanggal"])
+    df = apply_ledger_dtypes(df, strict=strict)
+
+    # Sort by date descending (stable, so same-day rows keep their insertion order);
+    # index labels (row ids) are kept
+    return df.sort_values("Tanggal", ascending=False, kind="mergesort")
+
+# Function to turn a ledger frame into stored records (row id as the first column)
+def ledger_records(df):
+    return df.rename_axis(id_col).reset_index()
+
+# Function to turn stored records back into a ledger frame indexed by row id
+# (files written before row ids existed get ids from their row order)
+def ledger_from_records(df):
+    if id_col not in df.columns:
+        return df.reset_index(drop=True)
+    df = df.set_index(id_col)
+    df.index = df.index.astype("int64")
+    df.index.name = None
+    return df
+
+# Function to merge normalized rows (indexed by row id) into a normalized ledger,
+# dropping the rows in drop_ids (rows replaced by new_rows must be among them).
+# The ledger is already date-sorted, so the new rows are inserted at their
+# searchsorted positions (after the rows of the same day) instead of sorting again,
+# and the result is made of ledger slices cut around the dropped and inserted rows.
+def merge_ledgers(ledger_df, new_rows, drop_ids=()):
+    new_rows = new_rows.copy()
+    if not new_rows.empty:
+        # Align categories so the concatenated columns stay categorical
+        for col in categorical_cols:
+            categories = ledger_df[col].cat.categories
+            if not new_rows[col].cat.categories.isin(categories).all():
+                categories = categories.union(new_rows[col].cat.categories)
+                ledger_df = ledger_df.assign(**{col: ledger_df[col].cat.set_categories(categories)})
+            new_rows[col] = new_rows[col].cat.set_categories(categories)
+
+    dropped = ledger_df.index.get_indexer(list(drop_ids)) if len(drop_ids) else np.array([], dtype="int64")
+    dropped = np.unique(dropped[dropped >= 0])
+    # Dates descending as ascending int64 keys; new rows are sorted, so their positions are too
+    # (both sides in nanoseconds: the datetime unit of the two frames can differ)
+    ledger_keys = -ledger_df["Tanggal"].to_numpy(dtype="datetime64[ns]").view("int64")
+    new_keys = -new_rows["Tanggal"].to_numpy(dtype="datetime64[ns]").view("int64")
+    positions = np.searchsorted(ledger_keys, new_keys, side="right")
+    cuts = np.unique(np.r_[0, dropped, dropped + 1, positions, len(ledger_df)])
+
+    if len(cuts) > MERGE_MAX_SLICES:
+        # Many cuts (bulk imports): one take over both frames
+        kept = np.delete(np.arange(len(ledger_df)), dropped)
+        if new_rows.empty:
+            # Delete-only change set: concatenating the empty frame would drop the categories
+            return ledger_df.take(kept)
+        order = np.insert(kept, np.searchsorted(kept, positions), np.arange(len(ledger_df), len(ledger_df) + len(new_rows)))
+        return pd.concat([ledger_df, new_rows]).take(order)
+
+    pieces = []
+    bounds, starts = np.unique(positions, return_index=True)
+    inserts = dict(zip(bounds, zip(starts, np.r_[starts[1:], len(new_rows)])))
+    is_dropped = set(dropped.tolist())
+    for start, end in zip(cuts[:-1], cuts[1:]):
+        if start in inserts:
+            pieces.append(new_rows.iloc[slice(*inserts[start])])
+        if start not in is_dropped:
+            pieces.append(ledger_df.iloc[start:end])
+    if len(ledger_df) in inserts:
+        pieces.append(new_rows.iloc[slice(*inserts[len(ledger_df)])])
+    return pd.concat(pieces) if pieces else ledger_df.iloc[:0]
+
+# Function to replay journal lines over the base ledger: the last line of each row id
+# wins, "delete" removes the row (journals written before row ids were all adds)
+def replay_journal(base_df, journal_df, next_id):
+    journal_df = journal_df.copy()
+    if "op" not in journal_df.columns:
+        journal_df["op"] = "add"
+    if id_col not in journal_df.columns:
+        journal_df[id_col] = range(next_id, next_id + len(journal_df))
+    journal_df = journal_df.drop_duplicates(subset=id_col, keep="last")
+    upserts = ledger_from_records(journal_df[journal_df["op"] != "delete"].drop(columns="op"))
+    base_df = base_df.drop(index=journal_df[id_col].astype("int64"), errors="ignore")
+    frames = [frame for frame in (base_df, upserts) if not frame.empty]
+    return normalize_ledger(pd.concat(frames) if frames else None)
+
+# Function to get the (mtime, size) signature of a file used to invalidate cached reads
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+# Base file stored as plain CSV text
+class CsvBackend:
+    name = "csv"
+    typed = False
+    incremental = False
+    range_reads = False
+
+    def __init__(self, data_dir):
+        self.path = os.path.join(data_dir, "transactions.csv")
+
+    def exists(self):
+        return os.path.exists(self.path) and os.path.getsize(self.path) > 0
+
+    def signature(self):
+        return file_signature(self.path)
+
+    def read(self):
+        if not self.exists():
+            return pd.DataFrame(columns=expected_cols)
+        return pd.read_csv(self.path)
+
+    def write(self, df):
+        tmp_path = self.path + ".tmp"
+        ledger_records(df).to_csv(tmp_path, index=False, date_format="%Y-%m-%d")
+        os.replace(tmp_path, self.path)
+
+# Base file stored as an uncompressed Arrow IPC file with the fixed ledger dtypes,
+# so loads are a memory-mapped read instead of a text parse.
+# The CSV ledger is migrated into it once, on first use.
+class ArrowBackend:
+    name = "arrow"
+    typed = True
+    incremental = False
+    range_reads = False
+
+    def __init__(self, data_dir):
+        self.path = os.path.join(data_dir, "transactions.arrow")
+        self.csv_backend = CsvBackend(data_dir)
+
+    # One-time migration from the CSV ledger
+    def migrate(self):
+        if os.path.exists(self.path) or not self.csv_backend.exists():
+            return
+        print(f"Migrating {self.csv_backend.path} to {self.path}")  # Debug print
+        self.write(normalize_ledger(ledger_from_records(self.csv_backend.read())))
+
+    def exists(self):
+        self.migrate()
+        return os.path.exists(self.path)
+
+    def signature(self):
+        return file_signature(self.path)
+
+    def read(self):
+        import pyarrow as pa
+
+        if not self.exists():
+            return pd.DataFrame(columns=expected_cols)
+        with pa.memory_map(self.path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+            return table.to_pandas()
+
+    def write(self, df):
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(ledger_records(df), preserve_index=False)
+        tmp_path = self.path + ".tmp"
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, self.path)
+
+# Ledger stored in an SQLite database (WAL mode) with indexes on date, (category,
+# subcategory) and payment method. Change sets are applied in place, and the
+# aggregates are computed with GROUP BY instead of from the loaded ledger.
+# The CSV ledger is migrated into it once, on first use.
+class SqliteBackend:
+    name = "sqlite"
+    typed = True
+    incremental = True
+    range_reads = True
+
+    def __init__(self, data_dir):
+        self.path = os.path.join(data_dir, "transactions.db")
+        self.csv_backend = CsvBackend(data_dir)
+        self._schema_ready = False
+        self._migrated = False
+
+    # Connection inside a transaction (committed on success), closed afterwards.
+    # Connecting creates the database, so the CSV ledger is migrated before the first connection.
+    @contextlib.contextmanager
+    def connect(self):
+        if not self._migrated:
+            self.migrate()
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if not self._schema_ready:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(
+                    """
+                    CREATE TABLE IF NOT EXISTS transactions (
+                        id INTEGER PRIMARY KEY, date TEXT NOT NULL, description TEXT, amount REAL,
+                        category TEXT, subcategory TEXT, payment_method TEXT, notes TEXT
+                    );
+                    -- The date index also covers the aggregate columns, so GROUP BY never reads the table
+                    CREATE INDEX IF NOT EXISTS idx_transactions_date
+                        ON transactions (date, category, subcategory, payment_method, amount);
+                    CREATE INDEX IF NOT EXISTS idx_transactions_category ON transactions (category, subcategory);
+                    CREATE INDEX IF NOT EXISTS idx_transactions_payment_method ON transactions (payment_method);
+                    """
+                )
+                self._schema_ready = True
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # One-time migration from the CSV ledger
+    def migrate(self):
+        self._migrated = True
+        if os.path.exists(self.path) or not self.csv_backend.exists():
+            return
+        print(f"Migrating {self.csv_backend.path} to {self.path}")  # Debug print
+        self.write(normalize_ledger(ledger_from_records(self.csv_backend.read())))
+
+    def exists(self):
+        self.migrate()
+        return os.path.exists(self.path)
+
+    # The WAL file changes on every commit, the database file on checkpoints
+    def signature(self):
+        return (file_signature(self.path) or (-1, -1)) + (file_signature(self.path + "-wal") or (-1, -1))
+
+    # Function to turn ledger records (ID column + ledger columns) into SQL parameter rows
+    @staticmethod
+    def _rows(records):
+        records = records[[id_col] + expected_cols].assign(Tanggal=records["Tanggal"].dt.strftime("%Y-%m-%d"))
+        records = records.astype(object).where(records.notna(), None)
+        return records.itertuples(index=False, name=None)
+
+    # Rows as ledger records, optionally only those between two dates (answered by the date index)
+    def read(self, start_date=None, end_date=None):
+        if not self.exists():
+            return pd.DataFrame(columns=[id_col] + expected_cols)
+        sql_cols = ", ".join(analysis_cols[col] for col in expected_cols)
+        if start_date or end_date:
+            start = pd.Timestamp(start_date).strftime("%Y-%m-%d") if start_date else "0000-00-00"
+            end = pd.Timestamp(end_date).strftime("%Y-%m-%d") if end_date else "9999-99-99"
+            query, params = f"SELECT id, {sql_cols} FROM transactions WHERE date BETWEEN ? AND ? ORDER BY id", (start, end)
+        else:
+            query, params = f"SELECT id, {sql_cols} FROM transactions", ()
+        with self.connect() as conn:
+            df = pd.DataFrame.from_records(conn.execute(query, params).fetchall(), columns=[id_col] + expected_cols)
+        df["Tanggal"] = pd.to_datetime(df["Tanggal"], format="%Y-%m-%d")
+        # Rows come in id order; the stable sort keeps it within a day
+        df = df.sort_values("Tanggal", ascending=False, kind="mergesort").reset_index(drop=True)
+        return apply_ledger_dtypes(df)
+
+    def write(self, df):
+        # A full write replaces whatever the migration would have copied
+        self._migrated = True
+        with self.connect() as conn:
+            conn.execute("DELETE FROM transactions")
+            conn.executemany("INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?)", self._rows(ledger_records(df)))
+
+    # Apply journal lines ("add"/"update" rows and "delete" ids) in one transaction
+    def apply(self, journal_df):
+        deletes = journal_df["op"] == "delete"
+        with self.connect() as conn:
+            conn.executemany("DELETE FROM transactions WHERE id = ?",
+                             [(int(row_id),) for row_id in journal_df.loc[deletes, id_col]])
+            conn.executemany("INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             self._rows(journal_df[~deletes]))
+
+    # Monthly and daily aggregates from one GROUP BY over the covering date index
+    def build_aggregates(self):
+        aggregates = LedgerAggregates()
+        null = lambda value: np.nan if value is None else value
+        days = {}
+        with self.connect() as conn:
+            groups = conn.execute(
+                "SELECT date, category, subcategory, payment_method, TOTAL(amount), COUNT(*) "
+                "FROM transactions GROUP BY 1, 2, 3, 4"
+            )
+            for date, category, subcategory, method, total, count in groups:
+                category, subcategory = null(category), null(subcategory)
+                for target, key in (
+                    (aggregates.monthly, (date[:7], category, subcategory, null(method))),
+                    (aggregates.daily, (days.setdefault(date, pd.Timestamp(date)), category, subcategory)),
+                ):
+                    entry = target.setdefault(key, [0.0, 0])
+                    entry[0] += total
+                    entry[1] += count
+        return aggregates
+
+STORAGE_BACKENDS = {
+    "csv": CsvBackend,
+    "arrow": ArrowBackend,
+    "sqlite": SqliteBackend,
+}
+
+# Function to create the storage backend, falling back to CSV when pyarrow is missing
+def get_backend(data_dir, name=None):
+    name = name or LEDGER_BACKEND
+    if name not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown ledger backend: {name}")
+    # Only look pyarrow up here; it is imported on the first read/write
+    if name == "arrow" and importlib.util.find_spec("pyarrow") is None:
+        print("pyarrow is not installed, using the CSV ledger backend")  # Debug print
+        name = "csv"
+    return STORAGE_BACKENDS[name](data_dir)
+
+# Materialized aggregates of the ledger: amount sums and row counts per
+# (month, category, subcategory, payment method) and per (day, category, subcategory).
+# They are kept as dicts so inserts and deletes update them in O(1) per row.
+class LedgerAggregates:
+    def __init__(self, df=None):
+        self.monthly = {}
+        self.daily = {}
+        self._frames = {}
+        if df is not None:
+            self.add(df)
+
+    # Add (sign=1) or remove (sign=-1) the rows of a normalized ledger frame
+    def add(self, df, sign=1):
+        if df is None or df.empty:
+            return
+        amounts = df["Jumlah (Rp)"].fillna(0.0)
+        groups = [
+            (self.monthly, [df["Tanggal"].dt.to_period("M").astype(str), df["Kategori"], df["Sub-kategori"], df["Metode Pembayaran"]]),
+            (self.daily, [df["Tanggal"].dt.normalize(), df["Kategori"], df["Sub-kategori"]]),
+        ]
+        for target, keys in groups:
+            grouped = amounts.groupby(keys, observed=True, dropna=False).agg(["sum", "size"])
+            for key, total, count in zip(grouped.index, grouped["sum"], grouped["size"]):
+                entry = target.setdefault(key, [0.0, 0])
+                entry[0] += sign * total
+                entry[1] += sign * count
+                if entry[1] <= 0:
+                    del target[key]
+        self._frames = {}
+
+    def remove(self, df):
+        self.add(df, sign=-1)
+
+    # Aggregates as a DataFrame with the English analysis column names (callers hold the
+    # store lock, see TransactionStore.aggregate_frame)
+    def frame(self, kind):
+        if kind not in self._frames:
+            if kind == "monthly":
+                key_cols = ["month", "category", "subcategory", "payment_method"]
+                target = self.monthly
+            else:
+                key_cols = ["date", "category", "subcategory"]
+                target = self.daily
+            # Keys and values from one snapshot, so they stay aligned
+            items = list(target.items())
+            frame = pd.DataFrame([key for key, _ in items], columns=key_cols)
+            frame["amount"] = pd.Series([value[0] for _, value in items], dtype="float64")
+            frame["count"] = pd.Series([value[1] for _, value in items], dtype="int64")
+            if kind == "monthly":
+                # First day of the month, so the period helpers of the daily data work here too
+                frame.insert(0, "date", pd.to_datetime(frame["month"], format="%Y-%m"))
+            self._frames[kind] = frame.sort_values("date").reset_index(drop=True)
+        return self._frames[kind].copy()
+
+# Inverted index for the description/note search. Every distinct (lowercased) text is
+# indexed once by its trigrams and tokens and keeps the ids of the rows that use it,
+# so a lookup costs the same however many transactions share a text.
+token_pattern = re.compile(r"\w+")
+
+# Function to get the searchable text of ledger rows
+def search_text(df):
+    return (df["Deskripsi"].fillna("").astype(str) + "\n" + df["Catatan"].fillna("").astype(str)).str.lower()
+
+class SearchIndex:
+    def __init__(self, df=None):
+        self.text_ids = {}
+        self.texts = []
+        self.rows = []
+        self.trigrams = {}
+        self.tokens = {}
+        self.sorted_tokens = []
+        self.text_by_row = np.full(0, -1, dtype="int64")
+        if df is not None:
+            self.add(df)
+
+    # Id of a distinct text, indexing it the first time it is seen
+    def _text_id(self, text, new_tokens):
+        text_id = self.text_ids.get(text)
+        if text_id is None:
+            text_id = len(self.texts)
+            self.text_ids[text] = text_id
+            self.texts.append(text)
+            self.rows.append([])
+            for i in range(len(text) - 2):
+                self.trigrams.setdefault(text[i:i + 3], set()).add(text_id)
+            for token in set(token_pattern.findall(text)):
+                if token not in self.tokens:
+                    self.tokens[token] = set()
+                    new_tokens.append(token)
+                self.tokens[token].add(text_id)
+        return text_id
+
+    # Add normalized ledger rows (their index labels are the row ids)
+    def add(self, df):
+        if df.empty:
+            return
+        codes, uniques = pd.factorize(search_text(df))
+        new_tokens = []
+        text_ids = np.array([self._text_id(text, new_tokens) for text in uniques], dtype="int64")
+        if len(new_tokens) > 16:
+            self.sorted_tokens = sorted(self.tokens)
+        else:
+            for token in new_tokens:
+                bisect.insort(self.sorted_tokens, token)
+
+        row_ids = df.index.to_numpy(dtype="int64")
+        row_text_ids = text_ids[codes]
+        if row_ids.max() >= len(self.text_by_row):
+            grown = np.full(int(row_ids.max()) + 1, -1, dtype="int64")
+            grown[:len(self.text_by_row)] = self.text_by_row
+            self.text_by_row = grown
+        self.text_by_row[row_ids] = row_text_ids
+
+        order = np.argsort(row_text_ids, kind="stable")
+        sorted_text_ids = row_text_ids[order]
+        starts = np.flatnonzero(np.r_[True, sorted_text_ids[1:] != sorted_text_ids[:-1]])
+        for group in np.split(row_ids[order], starts[1:]):
+            self.rows[self.text_by_row[group[0]]].extend(group.tolist())
+
+    # Remove ledger rows (by their row ids); every posting list is filtered once, however
+    # many of its rows go
+    def remove(self, df):
+        row_ids = df.index.to_numpy(dtype="int64")
+        row_ids = row_ids[(row_ids >= 0) & (row_ids < len(self.text_by_row))]
+        text_ids = self.text_by_row[row_ids]
+        row_ids, text_ids = row_ids[text_ids >= 0], text_ids[text_ids >= 0]
+        if not len(row_ids):
+            return
+        self.text_by_row[row_ids] = -1
+
+        order = np.argsort(text_ids, kind="stable")
+        sorted_text_ids = text_ids[order]
+        starts = np.flatnonzero(np.r_[True, sorted_text_ids[1:] != sorted_text_ids[:-1]])
+        for text_id, group in zip(sorted_text_ids[starts], np.split(row_ids[order], starts[1:])):
+            removed = set(group.tolist())
+            self.rows[text_id] = [row_id for row_id in self.rows[text_id] if row_id not in removed]
+
+    # Ids of distinct texts containing the query (or with a token starting with each query word)
+    def _matching_texts(self, query, prefix=False):
+        if prefix:
+            matched = None
+            for word in token_pattern.findall(query):
+                words = set()
+                i = bisect.bisect_left(self.sorted_tokens, word)
+                while i < len(self.sorted_tokens) and self.sorted_tokens[i].startswith(word):
+                    words |= self.tokens[self.sorted_tokens[i]]
+                    i += 1
+                matched = words if matched is None else matched & words
+            return matched or set()
+        if len(query) < 3:
+            return {text_id for text_id, text in enumerate(self.texts) if query in text}
+        postings = sorted(
+            (self.trigrams.get(query[i:i + 3], set()) for i in range(len(query) - 2)),
+            key=len
+        )
+        candidates = set.intersection(*postings)
+        # Trigram hits are candidates only; check the real substring
+        return {text_id for text_id in candidates if query in self.texts[text_id]}
+
+    # Row ids matching a case-insensitive substring (or word-prefix) query
+    def search(self, query, prefix=False):
+        query = query.strip().lower()
+        text_ids = self._matching_texts(query, prefix) if query else set()
+        row_ids = [row_id for text_id in text_ids for row_id in self.rows[text_id]]
+        return np.array(row_ids, dtype="int64")
+
+# Function to hash normalized ledger rows (one uint64 per row) for duplicate detection
+def row_hashes(df):
+    values = df[expected_cols].assign(Tanggal=df["Tanggal"].astype("datetime64[ns]"))
+    return pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+# Sorted multiset of the row hashes of the ledger, used to drop duplicate rows on import
+# without scanning the ledger. Membership is a binary search per hash.
+class RowHashIndex:
+    def __init__(self, df=None, hashes=None):
+        self.hashes = np.sort(row_hashes(df)) if df is not None else np.asarray(hashes, dtype="uint64")
+
+    def __len__(self):
+        return len(self.hashes)
+
+    # Boolean mask of the hashes that are already in the ledger
+    def contains(self, hashes):
+        positions = np.searchsorted(self.hashes, hashes)
+        found = positions < len(self.hashes)
+        found[found] = self.hashes[positions[found]] == hashes[found]
+        return found
+
+    def add(self, df):
+        hashes = np.sort(row_hashes(df))
+        self.hashes = np.insert(self.hashes, np.searchsorted(self.hashes, hashes), hashes)
+
+    # Remove one occurrence per removed row
+    def remove(self, df):
+        hashes = np.sort(row_hashes(df))
+        # Equal hashes remove consecutive occurrences
+        positions = np.searchsorted(self.hashes, hashes) + np.arange(len(hashes)) - np.searchsorted(hashes, hashes)
+        valid = positions < len(self.hashes)
+        valid[valid] = self.hashes[positions[valid]] == hashes[valid]
+        self.hashes = np.delete(self.hashes, positions[valid])
+
+# Query index over the cached ledger. The ledger is sorted by date (descending), so
+# date ranges are two binary searches; category filters compare categorical codes.
+class LedgerIndex:
+    def __init__(self, df):
+        self.df = df
+        dates = df["Tanggal"].to_numpy(dtype="datetime64[ns]").astype("int64")
+        # Negated so the descending ledger dates become an ascending array for searchsorted
+        self.neg_dates = -dates
+        self.codes = {col: df[col].cat.codes.to_numpy() for col in categorical_cols}
+        self.categories = {col: df[col].cat.categories for col in categorical_cols}
+        # Row id (index label) -> position, for turning search hits into positions
+        labels = df.index.to_numpy(dtype="int64")
+        self.position_by_id = np.full(int(labels.max()) + 1 if len(labels) else 0, -1, dtype="int64")
+        self.position_by_id[labels] = np.arange(len(labels))
+        self._ranks = {}
+
+    def __len__(self):
+        return len(self.df)
+
+    # Rank of every row when the ledger is sorted by col (ascending, stable); computed once per column
+    def sort_rank(self, col):
+        if col not in self._ranks:
+            values = self.df[col]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.cat.codes
+            order = np.argsort(values.to_numpy(), kind="stable")
+            rank = np.empty(len(order), dtype="int64")
+            rank[order] = np.arange(len(order))
+            self._ranks[col] = rank
+        return self._ranks[col]
+
+    # Sort row positions by a column using the precomputed ranks
+    def sort_positions(self, positions, sort_by="Tanggal", ascending=False):
+        if sort_by == "Tanggal":
+            # The ledger itself is already sorted by date, descending
+            ordered = np.sort(positions)
+            return ordered[::-1] if ascending else ordered
+        ordered = positions[np.argsort(self.sort_rank(sort_by)[positions], kind="stable")]
+        return ordered if ascending else ordered[::-1]
+
+    def min_date(self):
+        return self.df["Tanggal"].iloc[-1]
+
+    def max_date(self):
+        return self.df["Tanggal"].iloc[0]
+
+    # Sorted values of a categorical column
+    def options(self, col):
+        return sorted(self.categories[col].tolist())
+
+    # Row range [lo, hi) of the transactions between two dates (both days inclusive)
+    def date_range(self, start_date=None, end_date=None):
+        lo, hi = 0, len(self.neg_dates)
+        if end_date is not None:
+            end = pd.Timestamp(end_date).normalize() + pd.Timedelta(days=1)
+            lo = int(np.searchsorted(self.neg_dates, -end.value, side="right"))
+        if start_date is not None:
+            start = pd.Timestamp(start_date).normalize()
+            hi = int(np.searchsorted(self.neg_dates, -start.value, side="right"))
+        return lo, max(lo, hi)
+
+    # Sorted positions of the given row ids
+    def positions_of(self, row_ids):
+        row_ids = np.asarray(row_ids, dtype="int64")
+        row_ids = row_ids[(row_ids >= 0) & (row_ids < len(self.position_by_id))]
+        positions = self.position_by_id[row_ids]
+        return np.sort(positions[positions >= 0])
+
+    # Row positions matching a date range and exact categorical filters ({column: value}).
+    # With candidates (sorted positions, e.g. search hits) only those rows are checked.
+    def positions(self, start_date=None, end_date=None, filters=None, candidates=None):
+        lo, hi = self.date_range(start_date, end_date)
+        if candidates is None:
+            positions = np.arange(lo, hi)
+            window = slice(lo, hi)
+        else:
+            positions = candidates[(candidates >= lo) & (candidates < hi)]
+            window = positions
+        mask = None
+        for col, value in (filters or {}).items():
+            if value is None:
+                continue
+            code = self.categories[col].get_indexer([value])[0]
+            if code < 0:
+                return np.array([], dtype="int64")
+            col_mask = self.codes[col][window] == code
+            mask = col_mask if mask is None else mask & col_mask
+        if mask is None:
+            return positions
+        return positions[mask]
+
+# Raised when a save was prepared against a ledger version that another session has replaced
+class LedgerConflictError(Exception):
+    pass
+
+# Share of a monthly budget spent that raises a warning, and that counts as over budget
+BUDGET_WARNING_SHARE = 0.8
+BUDGET_OVER_SHARE = 1.0
+
+# Running Pengeluaran total per (month, subcategory), kept up to date by every save, so
+# budget alerts are checked against counters instead of rescanning the ledger. A save
+# takes the totals it is about to change (totals_of) and checks them again afterwards
+# (new_alerts) while it still holds the write lock.
+class BudgetMonitor:
+    # Alert levels from least to most severe: projected over budget at the current pace,
+    # BUDGET_WARNING_SHARE of the budget spent, budget spent
+    levels = [None, "pace", "warning", "over"]
+
+    def __init__(self, df=None):
+        self.spent = {}
+        if df is not None:
+            self.add(df)
+
+    # Pengeluaran total per (month, subcategory) of the rows of a normalized ledger frame
+    @staticmethod
+    def _expense_totals(df):
+        expenses = df[(df["Kategori"] == "Pengeluaran").to_numpy()]
+        return expenses["Jumlah (Rp)"].fillna(0.0).groupby(
+            [expenses["Tanggal"].dt.to_period("M").astype(str), expenses["Sub-kategori"]], observed=True
+        ).sum()
+
+    # Add (sign=1) or remove (sign=-1) the rows of a normalized ledger frame
+    def add(self, df, sign=1):
+        if df is None or df.empty:
+            return
+        for key, total in self._expense_totals(df).items():
+            self.spent[key] = self.spent.get(key, 0.0) + sign * total
+
+    def remove(self, df):
+        self.add(df, sign=-1)
+
+    # Current totals of the (month, subcategory) keys the rows of the frames fall in
+    def totals_of(self, *frames):
+        return {key: self.spent.get(key, 0.0)
+                for df in frames if df is not None and not df.empty
+                for key in self._expense_totals(df).index}
+
+    # Alert for spent against limit in month ("YYYY-MM"), or None
+    def _alert(self, month, subcategory, spent, limit, today):
+        if not limit or limit <= 0:
+            return None
+        projected = spent
+        level = None
+        if spent >= limit * BUDGET_OVER_SHARE:
+            level = "over"
+        elif spent >= limit * BUDGET_WARNING_SHARE:
+            level = "warning"
+        elif month == today.strftime("%Y-%m"):
+            # Month-to-date spending extrapolated to the whole month
+            projected = spent / today.day * today.days_in_month
+            if projected >= limit:
+                level = "pace"
+        if level is None:
+            return None
+        return {"month": month, "subcategory": subcategory, "level": level,
+                "spent": spent, "budget": limit, "projected": projected}
+
+    # Alerts of one month (default: the current one) for a budget {subcategory: limit}
+    def alerts(self, budget, month=None, today=None):
+        today = today or pd.Timestamp.today()
+        month = month or today.strftime("%Y-%m")
+        alerts = [self._alert(month, subcategory, self.spent.get((month, subcategory), 0.0), limit, today)
+                  for subcategory, limit in budget.items()]
+        return [alert for alert in alerts if alert is not None]
+
+    # Alerts that are more severe now than at the totals before ({(month, subcategory): spent})
+    def new_alerts(self, budget, before, today=None):
+        today = today or pd.Timestamp.today()
+        new_alerts = []
+        for (month, subcategory), spent_before in before.items():
+            limit = budget.get(subcategory)
+            alert = self._alert(month, subcategory, self.spent.get((month, subcategory), 0.0), limit, today)
+            previous = self._alert(month, subcategory, spent_before, limit, today)
+            if alert is not None and self.levels.index(alert["level"]) > self.levels.index(previous and previous["level"]):
+                new_alerts.append(alert)
+        return new_alerts
+
+# Function to build the description similarity index (the rows are embedded on the first
+# lookup, outside the store's locks)
+def build_similarity_index(df):
+    from embeddings import SimilarityIndex, get_embedding_service
+    return SimilarityIndex(get_embedding_service(), df)
+
+# Storage layer for the ledger: a date-sorted base file plus an append-only journal.
+# Single inserts only append to the journal; the journal is merged into the base
+# file (compaction) once it grows past JOURNAL_COMPACT_ROWS.
+# Writes hold an advisory lock on ledger.lock and bump the ledger version kept in
+# ledger.version, so sessions in other threads or processes never interleave saves.
+class TransactionStore:
+    # Structures derived from the ledger that are updated in place on append
+    derived_types = {
+        "aggregates": lambda df: LedgerAggregates(df),
+        "search": lambda df: SearchIndex(df),
+        "hashes": lambda df: RowHashIndex(df),
+        "categorizer": lambda df: TransactionCategorizer(df),
+        "similar": lambda df: build_similarity_index(df),
+        "budget_monitor": lambda df: BudgetMonitor(df),
+    }
+
+    def __init__(self, data_dir, backend=None):
+        self.data_dir = data_dir
+        self.backend = get_backend(data_dir, backend)
+        self.base_path = self.backend.path
+        self.journal_path = os.path.join(data_dir, "transactions.journal.csv")
+        self.budget_path = os.path.join(data_dir, "budget.csv")
+        self.hashes_path = os.path.join(data_dir, "transactions.hashes.npz")
+        self.lock_path = os.path.join(data_dir, "ledger.lock")
+        self.version_path = os.path.join(data_dir, "ledger.version")
+        self.lock = threading.RLock()
+        self._lock_file = None
+        self._lock_depth = 0
+        self._journal_rows = None
+        self._journal_signature = None
+        self._next_id = 0
+
+        # Parsed ledger/budget shared by all pages and sessions of this process.
+        # Entries are keyed on file mtime/size plus a write-version counter bumped by every save.
+        self.versions = {"ledger": 0, "budget": 0}
+        self.cache_stats = {"hits": 0, "misses": 0}
+        # Least recently used first; bounded by STORE_CACHE_MAX_ENTRIES
+        self._cache = OrderedDict()
+
+        # Derived structures (aggregates, search index) and the ledger key they are valid for
+        self._derived = {}
+
+    # Exclusive write access: the store lock for threads of this process plus an advisory
+    # lock file for other processes (taken once, nested writes reuse it)
+    @contextlib.contextmanager
+    def write_lock(self):
+        with self.lock:
+            if self._lock_depth == 0 and fcntl is not None:
+                os.makedirs(self.data_dir, exist_ok=True)
+                self._lock_file = open(self.lock_path, "a")
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and self._lock_file is not None:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+                    self._lock_file.close()
+                    self._lock_file = None
+
+    # Persisted ledger version, increased by every save that changes the ledger
+    def ledger_version(self):
+        try:
+            with open(self.version_path, encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    # Raise LedgerConflictError if the ledger moved past the version a save was prepared against
+    def _check_version(self, expected_version):
+        version = self.ledger_version()
+        if expected_version is not None and expected_version != version:
+            raise LedgerConflictError(
+                f"Ledger version is {version}, the changes were made against version {expected_version}"
+            )
+        return version
+
+    def _set_version(self, version):
+        tmp_path = self.version_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(str(version))
+        os.replace(tmp_path, self.version_path)
+
+    # Cache key of the ledger: base file, journal and ledger write version
+    def ledger_key(self):
+        return (self.backend.signature(), file_signature(self.journal_path), self.versions["ledger"])
+
+    # Cache key of the budget: budget file and budget write version
+    def budget_key(self):
+        return (file_signature(self.budget_path), self.versions["budget"])
+
+    # Return the cached value for name if its key still matches, otherwise load it
+    def cached(self, name, key, loader):
+        with self.lock:
+            entry = self._cache.get(name)
+            if entry is not None and entry[0] == key:
+                self.cache_stats["hits"] += 1
+                self._cache.move_to_end(name)
+                return entry[1]
+            self.cache_stats["misses"] += 1
+            value = loader()
+            self._cache[name] = (key, value)
+            self._cache.move_to_end(name)
+            # Drop the least recently used values; the parsed ledger itself is always kept
+            for old_name in [other for other in self._cache if other != "ledger"][:max(len(self._cache) - STORE_CACHE_MAX_ENTRIES, 0)]:
+                del self._cache[old_name]
+            return value
+
+    # Bump the write version of name ("ledger" or "budget") and store its fresh value, if known
+    def invalidate(self, name, value=None):
+        with self.lock:
+            self.versions[name] += 1
+            self._cache.pop(name, None)
+            if value is not None:
+                key = self.ledger_key() if name == "ledger" else self.budget_key()
+                self._cache[name] = (key, value)
+
+    # Parsed ledger from the cache (shared, callers must not modify it).
+    # Its index labels are row ids that stay stable while rows are appended in this process.
+    def load(self):
+        return self.cached("ledger", self.ledger_key(), self.read)
+
+    # Rows between two dates (inclusive). Backends with range reads (SQLite) answer this
+    # from their date index while the ledger is not loaded; otherwise the loaded ledger is sliced.
+    def read_range(self, start_date=None, end_date=None):
+        with self.lock:
+            entry = self._cache.get("ledger")
+            loaded = entry is not None and entry[0] == self.ledger_key()
+            if not loaded and self.backend.range_reads and self.journal_rows() == 0:
+                return ledger_from_records(self.backend.read(start_date, end_date))
+        ledger_index = self.index()
+        lo, hi = ledger_index.date_range(start_date or None, end_date or None)
+        return ledger_index.df.iloc[lo:hi]
+
+    # Query index of the current ledger (rebuilt lazily after each change)
+    def index(self):
+        with self.lock:
+            return self.cached("ledger_index", self.ledger_key(), lambda: LedgerIndex(self.load()))
+
+    # Derived structure of the current ledger, rebuilt only when the ledger changed
+    # other than through append(). Backends may build it themselves (build_<name>).
+    def derived(self, name):
+        with self.lock:
+            entry = self._derived.get(name)
+            if entry is None or entry[0] != self.ledger_key():
+                builder = getattr(self.backend, f"build_{name}", None)
+                if builder is not None and self.journal_rows() == 0:
+                    value = builder()
+                else:
+                    value = self.derived_types[name](self.load())
+                entry = self._derived[name] = [self.ledger_key(), value]
+            return entry[1]
+
+    def aggregates(self):
+        return self.derived("aggregates")
+
+    # Aggregates as a DataFrame ("monthly" or "daily"), read under the store lock so a
+    # save in another session cannot change them while the frame is built
+    def aggregate_frame(self, kind):
+        with self.lock:
+            return self.aggregates().frame(kind)
+
+    def search_index(self):
+        return self.derived("search")
+
+    # Category suggestions learned from the ledger (edits retrain it in place)
+    def categorizer(self):
+        return self.derived("categorizer")
+
+    # Running spending per month and subcategory for the budget alerts
+    def budget_monitor(self):
+        return self.derived("budget_monitor")
+
+    # Nearest-neighbour lookup by description embeddings (only built when first used). Saves
+    # only queue their rows in it; the model runs when the index is queried.
+    def similarity_index(self):
+        return self.derived("similar")
+
+    # Row hashes of the current ledger. They are persisted next to the ledger files and
+    # reused while those files are unchanged, otherwise rebuilt from the ledger.
+    def row_hashes(self):
+        with self.lock:
+            entry = self._derived.get("hashes")
+            if entry is None or entry[0] != self.ledger_key():
+                persisted = self._read_row_hashes()
+                if persisted is not None:
+                    self._derived["hashes"] = [self.ledger_key(), persisted]
+            return self.derived("hashes")
+
+    # File signatures the persisted row hashes were saved for
+    def _files_signature(self):
+        signatures = [self.backend.signature(), file_signature(self.journal_path)]
+        return np.array([value for sig in signatures for value in (sig or (-1, -1))], dtype="int64")
+
+    def _read_row_hashes(self):
+        if not os.path.exists(self.hashes_path):
+            return None
+        with np.load(self.hashes_path) as saved:
+            if not np.array_equal(saved["signature"], self._files_signature()):
+                return None
+            return RowHashIndex(hashes=saved["hashes"])
+
+    # Persist the row hashes if they match the ledger files as they are now
+    def save_row_hashes(self):
+        with self.lock:
+            entry = self._derived.get("hashes")
+            if entry is None or entry[0] != self.ledger_key():
+                return
+            tmp_path = self.hashes_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(f, hashes=entry[1].hashes, signature=self._files_signature())
+            os.replace(tmp_path, self.hashes_path)
+
+    # Names of the derived structures that match the ledger as it is now
+    def _current_derived(self):
+        key = self.ledger_key()
+        return [name for name, entry in self._derived.items() if entry[0] == key]
+
+    # Number of rows waiting in the journal (recounted only when another process changed the file)
+    def journal_rows(self):
+        signature = file_signature(self.journal_path)
+        if self._journal_rows is None or signature != self._journal_signature:
+            if signature is not None and signature[1] > 0:
+                # Newlines are counted, so a torn last line (see _append_journal) is not a row
+                with open(self.journal_path, "rb") as f:
+                    self._journal_rows = max(sum(block.count(b"\n") for block in iter(lambda: f.read(1 << 20), b"")) - 1, 0)
+            else:
+                self._journal_rows = 0
+            self._journal_signature = signature
+        return self._journal_rows
+
+    # Whether the base file or the journal holds any data
+    def exists(self):
+        return self.backend.exists() or self.journal_rows() > 0
+
+    def _read_journal(self):
+        if self.journal_rows() == 0:
+            return pd.DataFrame(columns=journal_cols)
+        with open(self.journal_path, "rb") as f:
+            data = f.read()
+        # A torn last line was never committed (the ledger version was not raised), skip it
+        return pd.read_csv(io.BytesIO(data[:data.rfind(b"\n") + 1]))
+
+    # Whether the journal was written before row ids existed (no op/ID columns)
+    def _journal_is_legacy(self):
+        if self.journal_rows() == 0:
+            return False
+        with open(self.journal_path, encoding="utf-8") as f:
+            return not f.readline().startswith("op,")
+
+    # Write the base file (backends go through a temp file so readers never see a half-written ledger)
+    def _write_base(self, df):
+        os.makedirs(self.data_dir, exist_ok=True)
+        self.backend.write(df)
+
+    def _clear_journal(self):
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self._journal_rows = 0
+        self._journal_signature = None
+
+    # Read base and journal and merge them into one date-sorted ledger indexed by row id
+    def read(self):
+        with self.lock:
+            base_df = ledger_from_records(self.backend.read())
+            # A ledger without a base file yet (a new profile) comes back untyped as well
+            if not self.backend.typed or base_df.empty:
+                base_df = normalize_ledger(base_df)
+            self._next_id = int(base_df.index.max()) + 1 if len(base_df) else 0
+            if self.journal_rows() == 0:
+                return base_df
+            journal_df = self._read_journal()
+            if id_col in journal_df.columns and len(journal_df):
+                self._next_id = max(self._next_id, int(journal_df[id_col].max()) + 1)
+            df = replay_journal(base_df, journal_df, self._next_id)
+            self._next_id = max(self._next_id, int(df.index.max()) + 1 if len(df) else 0)
+            return df
+
+    # Replace the whole ledger (the journal is folded into the new base file)
+    def write(self, df, expected_version=None):
+        with self.write_lock():
+            version = self._check_version(expected_version)
+            df = normalize_ledger(df, strict=True)
+            df.index = pd.RangeIndex(len(df))
+            self._write_base(df)
+            self._clear_journal()
+            self._set_version(version + 1)
+            self._next_id = len(df)
+            self.invalidate("ledger", df)
+            # Row ids start over, so derived structures are rebuilt on next use
+            self._derived = {}
+            return df
+
+    # Append journal lines: the lines are rendered first and written with one append and
+    # an fsync, so a save costs the size of its change set rather than of the journal.
+    # The journal is not rewritten through a temp file: a crash during the write can leave
+    # a torn last line, which readers skip and the next append cuts off first.
+    def _append_journal(self, journal_df):
+        os.makedirs(self.data_dir, exist_ok=True)
+        previous_rows = self.journal_rows()
+        if previous_rows:
+            self._trim_torn_journal()
+        lines = journal_df.to_csv(index=False, header=previous_rows == 0, date_format="%Y-%m-%d")
+        # A journal without lines (missing or emptied) starts over with the header
+        with open(self.journal_path, "w" if previous_rows == 0 else "a", newline="", encoding="utf-8") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_rows = previous_rows + len(journal_df)
+        self._journal_signature = file_signature(self.journal_path)
+
+    # Cut off a torn last line (a write interrupted by a crash), so appended lines start on
+    # a line of their own
+    def _trim_torn_journal(self):
+        with open(self.journal_path, "rb+") as f:
+            if f.seek(0, os.SEEK_END) == 0:
+                return
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) == b"\n":
+                return
+            f.seek(0)
+            data = f.read()
+            f.truncate(data.rfind(b"\n") + 1)
+            f.flush()
+            os.fsync(f.fileno())
+
+    # Apply a change set: added rows (dicts or a DataFrame), edited rows ({row_id: {column: value}})
+    # and deleted row ids. Only the changed rows are written (to the journal).
+    # With expected_version, the save fails if another session saved in the meantime.
+    # Returns the number of journal lines and, with a budget ({subcategory: limit}), the
+    # budget alerts this change set made more severe.
+    def apply_changes(self, added=None, edited=None, deleted=None, expected_version=None, budget=None):
+        with self.write_lock():
+            version = self._check_version(expected_version)
+            if self._journal_is_legacy():
+                self.compact()
+            ledger = self.load()
+            if budget is not None:
+                # Built before the change, so the change updates its counters in place
+                self.budget_monitor()
+            current_derived = self._current_derived()
+
+            deleted_ids = [int(row_id) for row_id in (deleted or []) if int(row_id) in ledger.index]
+            edited = {int(row_id): changes for row_id, changes in (edited or {}).items()
+                      if int(row_id) in ledger.index and int(row_id) not in deleted_ids}
+            added = pd.DataFrame(added if added is not None else [], columns=expected_cols)
+            if not (len(added) or edited or deleted_ids):
+                return 0, []
+
+            # Edited rows are stored whole: current values with the changes applied
+            edited_rows = []
+            for row_id, changes in edited.items():
+                row = ledger.loc[row_id, expected_cols].to_dict()
+                row.update({col: value for col, value in changes.items() if col in expected_cols})
+                edited_rows.append(row)
+            first_added_id = self._next_id
+            added.index = pd.RangeIndex(first_added_id, first_added_id + len(added))
+            self._next_id += len(added)
+
+            new_rows = pd.DataFrame(edited_rows, columns=expected_cols, index=list(edited))
+            new_rows = normalize_ledger(pd.concat([new_rows, added]) if edited_rows else added, strict=True)
+            if new_rows["Tanggal"].isna().any():
+                raise ValueError("Tanggal is required for every transaction")
+
+            journal_df = ledger_records(new_rows)
+            journal_df.insert(0, "op", np.where(journal_df[id_col] >= first_added_id, "add", "update"))
+            if deleted_ids:
+                deletes = pd.DataFrame({"op": "delete", id_col: deleted_ids})
+                journal_df = pd.concat([journal_df, deletes], ignore_index=True)
+
+            merged_df = merge_ledgers(ledger, new_rows, list(edited) + deleted_ids)
+            if self.backend.incremental and self.journal_rows() == 0:
+                # The backend applies the change set in place
+                self.backend.apply(journal_df[journal_cols])
+            elif self.journal_rows() + len(journal_df) >= JOURNAL_COMPACT_ROWS:
+                # Large change sets (bulk imports) go straight into a new base file
+                self._write_base(merged_df)
+                self._clear_journal()
+            else:
+                self._append_journal(journal_df[journal_cols])
+            self._set_version(version + 1)
+
+            # Update the cached ledger and derived structures with just the changed rows
+            old_rows = ledger.loc[list(edited) + deleted_ids] if edited or deleted_ids else ledger.iloc[:0]
+            monitor = self._derived["budget_monitor"][1] if budget is not None else None
+            spent_before = monitor.totals_of(old_rows, new_rows) if monitor is not None else {}
+            self.invalidate("ledger", merged_df)
+            for name in current_derived:
+                self._derived[name][1].remove(old_rows)
+                self._derived[name][1].add(new_rows)
+                self._derived[name][0] = self.ledger_key()
+            # Checked under the write lock: the alerts belong to this change set only
+            alerts = monitor.new_alerts(budget, spent_before) if monitor is not None else []
+            return len(journal_df), alerts
+
+    # Append new rows (a change set with additions only)
+    def append(self, rows, budget=None):
+        return self.apply_changes(added=rows, budget=budget)
+
+    # Merge the journal into the sorted base file
+    def compact(self):
+        with self.write_lock():
+            if self.journal_rows() == 0:
+                return
+            current_derived = self._current_derived()
+            df = self.load()
+            self._write_base(df)
+            self._clear_journal()
+            self.invalidate("ledger", df)
+            # Compaction does not change the ledger contents or its row ids
+            for name in current_derived:
+                self._derived[name][0] = self.ledger_key()
+            self.save_row_hashes()
+            print(f"Journal compacted into {self.base_path}")  # Debug print
+
+# Open ledger stores by ledger id, least recently used first: [store, last used time]
+_stores = OrderedDict()
+_stores_lock = threading.Lock()
+# Store of the ledger a background thread works on (set by import jobs)
+_thread_ledger = threading.local()
+
+# Function to get the directory of a ledger (created on first use)
+def ledger_dir(ledger_id):
+    if not ledger_id_pattern.match(ledger_id):
+        raise ValueError(f"Nama profil tidak valid: {ledger_id!r} (gunakan huruf, angka, - atau _)")
+    if ledger_id == DEFAULT_LEDGER_ID:
+        return DATA_DIR
+    path = os.path.join(LEDGERS_DIR, ledger_id)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+# Function to get the ledger id of the current session (the default ledger outside a session)
+def current_ledger_id():
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return DEFAULT_LEDGER_ID
+    return st.session_state.get("ledger_id", DEFAULT_LEDGER_ID)
+
+# Function to get the ledger storage of a ledger (default: the one of the current session).
+# Idle and least recently used ledgers are closed; their files stay on disk.
+def get_store(ledger_id=None):
+    if ledger_id is None:
+        thread_store = getattr(_thread_ledger, "store", None)
+        if thread_store is not None:
+            return thread_store
+        ledger_id = current_ledger_id()
+    now = time.time()
+    with _stores_lock:
+        entry = _stores.pop(ledger_id, None)
+        store = entry[0] if entry is not None else TransactionStore(ledger_dir(ledger_id))
+        _stores[ledger_id] = [store, now]
+        for other_id, (other, last_used) in list(_stores.items()):
+            if other_id != ledger_id and (len(_stores) > MAX_OPEN_LEDGERS or now - last_used > LEDGER_IDLE_SECONDS):
+                del _stores[other_id]
+        return store
+
+# Function to get the ids of the ledgers on disk (the default ledger first); only offered
+# to sessions when LIST_ALL_LEDGERS is set
+def list_ledgers():
+    others = sorted(name for name in os.listdir(LEDGERS_DIR) if ledger_id_pattern.match(name)) if os.path.isdir(LEDGERS_DIR) else []
+    return [DEFAULT_LEDGER_ID] + others
+
+# Function to get the ledger ids the profile selector offers to the current session: the
+# default ledger and the profiles this session opened (all ledgers with LIST_ALL_LEDGERS)
+def session_ledgers():
+    if LIST_ALL_LEDGERS:
+        return list_ledgers()
+    opened = st.session_state.setdefault("opened_ledger_ids", [DEFAULT_LEDGER_ID])
+    current = current_ledger_id()
+    if current not in opened:
+        opened.append(current)
+    return list(opened)
+
+# Function to get the query index of the ledger (date-sorted, with categorical codes)
+def get_ledger_index():
+    return get_store().index()
+
+# Function to get the ledger index and the positions of the rows matching a query
+def query_positions(start_date=None, end_date=None, filters=None, search=None, search_prefix=False):
+    store = get_store()
+    ledger_index = store.index()
+    candidates = None
+    if search:
+        row_ids = store.search_index().search(search, prefix=search_prefix)
+        candidates = ledger_index.positions_of(row_ids)
+    return ledger_index, ledger_index.positions(start_date, end_date, filters, candidates)
+
+# Function to query transactions by date range (days inclusive), {column: value} filters
+# and an optional description/note search (substring, or word prefix with search_prefix=True)
+def query_transactions(start_date=None, end_date=None, filters=None, search=None, search_prefix=False):
+    ledger_index, positions = query_positions(start_date, end_date, filters, search, search_prefix)
+    return ledger_index.df.take(positions)
+
+# Function to find the transactions with descriptions most similar in meaning to a text;
+# returns the rows of the k closest descriptions with their similarity in "Kemiripan"
+def find_similar_transactions(description, k=10):
+    store = get_store()
+    row_ids, scores = store.similarity_index().most_similar(description, k)
+    ledger_index = store.index()
+    positions = ledger_index.positions_of(row_ids)
+    similar = ledger_index.df.take(positions)
+    similar["Kemiripan"] = pd.Series(scores, index=row_ids).reindex(similar.index).to_numpy()
+    return similar.sort_values("Kemiripan", ascending=False, kind="stable")
+
+# Function to get one page (1-based) of the matching transactions sorted by any column;
+# returns the page rows and the total number of matching rows
+def get_transaction_page(start_date=None, end_date=None, filters=None, search=None,
+                         sort_by="Tanggal", ascending=False, page=1, page_size=50):
+    ledger_index, positions = query_positions(start_date, end_date, filters, search)
+    ordered = ledger_index.sort_positions(positions, sort_by, ascending)
+    # Pages past the end show the last page
+    page = min(max(page, 1), max((len(ordered) + page_size - 1) // page_size, 1))
+    start = (page - 1) * page_size
+    return ledger_index.df.take(ordered[start:start + page_size]), len(positions)
+
+# Function to save a change set: added rows, edited rows ({row_id: {column: value}}) and
+# deleted row ids; only the changed rows are written
+def apply_transaction_changes(added=None, edited=None, deleted=None, expected_version=None):
+    try:
+        store = get_store()
+        count, alerts = store.apply_changes(added, edited, deleted, expected_version, budget=load_budget_csv())
+        print(f"Saved {count} changed transactions to journal")  # Debug print
+        notify_new_budget_alerts(alerts)
+        return True
+    except LedgerConflictError as e:
+        print(f"Conflict saving data: {str(e)}")  # Debug print
+        st.error("Data transaksi sudah diubah di sesi lain. Perubahan belum disimpan, silakan muat ulang dan ulangi perubahan.")
+        return False
+    except Exception as e:
+        print(f"Error saving data: {str(e)}")  # Debug print
+        st.error(f"Error saving data: {str(e)}")
+        return False
+
+# Function to get the budget alerts of a month ("YYYY-MM", default: the current month)
+def get_budget_alerts(month=None):
+    return get_store().budget_monitor().alerts(load_budget_csv(), month)
+
+# Function to describe a budget alert
+def budget_alert_message(alert):
+    subcategory = alert["subcategory"]
+    month = "bulan ini" if alert["month"] == pd.Timestamp.today().strftime("%Y-%m") else f"bulan {alert['month']}"
+    share = alert["spent"] / alert["budget"] * 100
+    if alert["level"] == "over":
+        return (f"🚨 Pengeluaran {subcategory} {month} Rp{alert['spent']:,.0f} sudah melebihi "
+                f"anggaran Rp{alert['budget']:,.0f} ({share:.0f}%).")
+    if alert["level"] == "warning":
+        return (f"⚠️ Pengeluaran {subcategory} {month} sudah {share:.0f}% dari anggaran "
+                f"(Rp{alert['spent']:,.0f} dari Rp{alert['budget']:,.0f}).")
+    return (f"📈 Dengan laju saat ini, pengeluaran {subcategory} {month} diperkirakan "
+            f"Rp{alert['projected']:,.0f}, di atas anggaran Rp{alert['budget']:,.0f}.")
+
+# Function to show the budget alerts of the current month (at the top of every page)
+def show_budget_alerts():
+    show = {"over": st.error, "warning": st.warning, "pace": st.info}
+    for alert in get_budget_alerts():
+        show[alert["level"]](budget_alert_message(alert))
+
+# Function to pop up the alerts that a save of this session made more severe
+def notify_new_budget_alerts(alerts):
+    for alert in alerts:
+        st.toast(budget_alert_message(alert))
+
+# Function to turn the st.data_editor state of one page into a change set: the editor
+# reports edited/deleted rows by position, which map to row ids through the page index
+def save_editor_changes(page_df, editor_state, expected_version=None):
+    row_ids = page_df.index
+    edited = {int(row_ids[pos]): changes for pos, changes in editor_state.get("edited_rows", {}).items()}
+    deleted = [int(row_ids[pos]) for pos in editor_state.get("deleted_rows", [])]
+    # Rows added in the editor but left empty are ignored
+    added = [row for row in editor_state.get("added_rows", [])
+             if any(value not in (None, "") for value in row.values())]
+    return apply_transaction_changes(added, edited, deleted, expected_version)
+
+# Function to suggest Kategori and Sub-kategori for descriptions (DataFrame with both columns)
+def suggest_categories(descriptions):
+    return get_store().categorizer().predict(descriptions)
+
+# Function to get the ledger version (increased by every save, in any session)
+def get_ledger_version():
+    return get_store().ledger_version()
+
+# Function to get monthly sums/counts per (month, category, subcategory, payment_method)
+def get_monthly_aggregates():
+    return get_store().aggregate_frame("monthly")
+
+# Function to get daily sums/counts per (date, category, subcategory)
+def get_daily_aggregates():
+    return get_store().aggregate_frame("daily")
+
+# Function to get the ledger/budget cache hit and miss counters
+def get_cache_stats():
+    store = get_store()
+    stats = dict(store.cache_stats, **{f"{name}_version": version for name, version in store.versions.items()})
+    stats["open_ledgers"] = len(_stores)
+    return stats
+
 # Function to save DataFrame to CSV
 def save_to_csv(df):
     try:
-        # Create data directory if it doesn't exist
-        os.makedirs(DATA_DIR, exist_ok=True)
-        
-        # If df is empty, create a new one with correct columns
-        if df is None or df.empty:
-            df = pd.DataFrame(columns=expected_cols)
-        
-        # Ensure all columns exist
-        for col in expected_cols:
-            if col not in df.columns:
-                df[col] = ""
-        
-        # Convert date column to datetime
-        df["Tanggal"] = pd.to_datetime(df["Tanggal"])
-        
-        # Sort by date descending
-        df = df.sort_values("Tanggal", ascending=False)
-        
-        # Save to CSV with proper date format
-        df.to_csv(transactions_data, index=False, date_format="%Y-%m-%d")
-        print(f"Data saved to {transactions_data}")  # Debug print
+        # Rewrite the whole ledger (base file), dropping the journal it replaces
+        store = get_store()
+        store.write(df)
+        print(f"Data saved to {store.base_path}")  # Debug print
         
         return True
     except Exception as e:
@@ -52,36 +1413,215 @@ def save_to_csv(df):
         st.error(f"Error saving data: {str(e)}")
         return False
 
+# Function to append new transactions without rewriting the ledger
+def append_transactions(rows):
+    try:
+        store = get_store()
+        count, alerts = store.append(rows, budget=load_budget_csv())
+        print(f"Appended {count} transactions to journal")  # Debug print
+        notify_new_budget_alerts(alerts)
+        return True
+    except Exception as e:
+        print(f"Error saving data: {str(e)}")  # Debug print
+        st.error(f"Error saving data: {str(e)}")
+        return False
+
+# Function to validate one chunk of an uploaded CSV with vectorized checks; returns the
+# valid rows (normalized) and the rejected rows with their line number and reason
+def validate_import_chunk(chunk, first_line):
+    chunk.columns = [col.strip() for col in chunk.columns]
+    missing_cols = [col for col in expected_cols if col not in chunk.columns]
+    if missing_cols:
+        raise ValueError(f"Kolom berikut tidak ditemukan di file CSV: {missing_cols}")
+    chunk = chunk[expected_cols].reset_index(drop=True)
+
+    dates = pd.to_datetime(chunk["Tanggal"], errors="coerce")
+    amounts = pd.to_numeric(chunk["Jumlah (Rp)"], errors="coerce")
+    reasons = np.select(
+        [dates.isna().to_numpy(), amounts.isna().to_numpy()],
+        ["Tanggal tidak valid", "Jumlah (Rp) tidak valid"],
+        default=""
+    )
+    bad = reasons != ""
+
+    bad_rows = chunk[bad].copy()
+    bad_rows.insert(0, "Baris", np.flatnonzero(bad) + first_line)
+    bad_rows["Alasan"] = reasons[bad]
+    valid_rows = chunk[~bad].assign(Tanggal=dates[~bad], **{"Jumlah (Rp)": amounts[~bad]})
+    return normalize_ledger(valid_rows), bad_rows
+
+# Raised inside an import job that was cancelled before its rows were published
+class ImportCancelled(Exception):
+    pass
+
+# Progress and result of one background CSV import
+class ImportJob:
+    def __init__(self, name, size):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.size = size
+        # "queued", "running", "done", "failed" or "cancelled"
+        self.status = "queued"
+        self.bytes_read = 0
+        self.rows_processed = 0
+        self.rows_rejected = 0
+        self.duplicates = 0
+        self.result = None
+        self.error = None
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    # Fraction of the file read so far
+    def progress(self):
+        if self.status == "done":
+            return 1.0
+        return min(self.bytes_read / self.size, 1.0) if self.size else 0.0
+
+# Function to import an uploaded CSV in chunks: rows are validated, rows already in the
+# ledger (or earlier in the upload) are skipped by their hash, and the new rows are
+# appended in one bulk write. Work and memory grow with the upload, not the ledger.
+# A job, if given, receives progress after every chunk and can cancel the import.
+def import_transactions(file, chunk_rows=IMPORT_CHUNK_ROWS, max_bad_rows=1000, job=None, store=None):
+    store = store or get_store()
+    ledger_hashes = store.row_hashes()
+    categorizer = store.categorizer()
+    seen = set()
+    new_frames, bad_frames = [], []
+    result = {"imported": 0, "duplicates": 0, "rejected": 0, "alerts": []}
+
+    # Line 1 is the header
+    first_line = 2
+    for chunk in pd.read_csv(file, chunksize=chunk_rows, dtype=str, keep_default_na=False):
+        valid_rows, bad_rows = validate_import_chunk(chunk, first_line)
+        # Bank exports often come without categories; blank ones are filled with suggestions
+        valid_rows = categorizer.fill_missing(valid_rows)
+        first_line += len(chunk)
+        result["rejected"] += len(bad_rows)
+        if sum(len(frame) for frame in bad_frames) < max_bad_rows:
+            bad_frames.append(bad_rows)
+
+        hashes = row_hashes(valid_rows)
+        duplicate = ledger_hashes.contains(hashes) | pd.Series(hashes).duplicated().to_numpy()
+        duplicate |= np.fromiter((h in seen for h in hashes.tolist()), dtype=bool, count=len(hashes))
+        seen.update(hashes[~duplicate].tolist())
+        result["duplicates"] += int(duplicate.sum())
+        new_frames.append(valid_rows[~duplicate])
+
+        if job is not None:
+            job.bytes_read = file.tell()
+            job.rows_processed = first_line - 2
+            job.rows_rejected = result["rejected"]
+            job.duplicates = result["duplicates"]
+            if job.cancelled:
+                raise ImportCancelled()
+
+    new_rows = pd.concat(new_frames) if new_frames else None
+    if new_rows is not None and len(new_rows):
+        with store.write_lock():
+            # Rows saved by another session while the file was being read are skipped too
+            published = ~store.row_hashes().contains(row_hashes(new_rows))
+            result["duplicates"] += int((~published).sum())
+            new_rows = new_rows[published]
+            if job is not None and job.cancelled:
+                raise ImportCancelled()
+            # One change set: the rows become visible together, and the ledger caches move on
+            _, result["alerts"] = store.apply_changes(added=new_rows, budget=load_budget_csv())
+            store.save_row_hashes()
+        result["imported"] = len(new_rows)
+    result["bad_rows"] = pd.concat(bad_frames).head(max_bad_rows) if bad_frames else pd.DataFrame()
+    print(f"Imported {result['imported']} transactions, skipped {result['duplicates']} duplicates and {result['rejected']} invalid rows")  # Debug print
+    return result
+
+# Background import jobs shared by all sessions, so an upload does not block the page
+_import_executor = None
+_import_jobs = {}
+_import_jobs_lock = threading.Lock()
+
+def _run_import_job(job, data, store):
+    if job.cancelled:
+        job.status = "cancelled"
+        return
+    job.status = "running"
+    # Everything the import touches (budget, alerts) belongs to the ledger it was started for
+    _thread_ledger.store = store
+    try:
+        job.result = import_transactions(io.BytesIO(data), job=job, store=store)
+        job.status = "done"
+    except ImportCancelled:
+        job.status = "cancelled"
+    except Exception as e:
+        print(f"Error importing {job.name}: {str(e)}")  # Debug print
+        job.error = str(e)
+        job.status = "failed"
+    finally:
+        _thread_ledger.store = None
+
+# Function to start importing an uploaded file in the background; returns the job
+def start_import_job(uploaded_file):
+    global _import_executor
+    data = uploaded_file.getvalue()
+    job = ImportJob(uploaded_file.name, len(data))
+    with _import_jobs_lock:
+        if _import_executor is None:
+            _import_executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix="import")
+        # Keep only the jobs that are still running plus the most recent finished ones
+        finished = [job_id for job_id, other in _import_jobs.items() if other.finished]
+        for job_id in finished[:-20]:
+            del _import_jobs[job_id]
+        _import_jobs[job.id] = job
+        _import_executor.submit(_run_import_job, job, data, get_store())
+    return job
+
+# Function to get a background import job by id (None once it is forgotten)
+def get_import_job(job_id):
+    return _import_jobs.get(job_id)
+
+# Function to cancel a background import job; rows are only published when the whole file is read
+def cancel_import_job(job_id):
+    job = _import_jobs.get(job_id)
+    if job is not None:
+        job.cancel()
+    return job
+
+# Function to copy the ledger (base file and journal) from one storage backend to
+# another, e.g. migrate_ledger("sqlite") before running with LEDGER_BACKEND=sqlite.
+# The source defaults to the backend in use; its journal (shared by all backends) is
+# compacted into its base file first, so no pending change is lost.
+def migrate_ledger(target, source=LEDGER_BACKEND, data_dir=None):
+    data_dir = data_dir or get_store().data_dir
+    source_store = TransactionStore(data_dir, source)
+    target_store = TransactionStore(data_dir, target)
+    # Under the source's write lock, so no save lands between the copy and the switch
+    with source_store.write_lock():
+        source_store.compact()
+        df = source_store.load()
+        # Row ids are kept; the target reads the same (now empty) journal
+        target_store._write_base(df)
+    print(f"Migrated {len(df)} transactions from {source_store.backend.name} to {target_store.backend.name}")  # Debug print
+    return len(df)
+
 # Function to load DataFrame from CSV
 def load_csv():
     try:
-        if os.path.exists(transactions_data):
-            print(f"Loading data from {transactions_data}")  # Debug print
-            df = pd.read_csv(transactions_data)
-            
-            # Ensure all expected columns exist
-            for col in expected_cols:
-                if col not in df.columns:
-                    df[col] = ""
-            
-            # Reorder columns to match expected order
-            df = df[expected_cols]
-            
-            # Convert date column properly
-            df["Tanggal"] = pd.to_datetime(df["Tanggal"], errors="coerce")
-            df = df.dropna(subset=["Tanggal"])
-            
-            # Sort by date
-            df = df.sort_values("Tanggal", ascending=False).reset_index(drop=True)
-            
-            print(f"Loaded {len(df)} transactions")  # Debug print
+        store = get_store()
+        if store.exists():
+            # Shared parsed ledger; hand out a copy so pages can modify it freely
+            df = store.load().reset_index(drop=True)
             return df
         else:
             print("Creating new transaction file")  # Debug print
-            df = pd.DataFrame(columns=expected_cols)
             # Save empty DataFrame to create the file
-            df.to_csv(transactions_data, index=False)
-            return df
+            return store.write(pd.DataFrame(columns=expected_cols))
     except Exception as e:
         print(f"Error loading data: {str(e)}")  # Debug print
         st.error(f"Error loading data: {str(e)}")
@@ -89,10 +1629,11 @@ def load_csv():
 
 # Function to save budget dictionary to CSV
 def save_budget_csv(budget_dict):
-    budget_file = os.path.join(DATA_DIR, "budget.csv")
+    store = get_store()
+    budget_file = store.budget_path
     try:
         # Create data directory if it doesn't exist
-        os.makedirs(DATA_DIR, exist_ok=True)
+        os.makedirs(store.data_dir, exist_ok=True)
         
         # Create DataFrame from budget dictionary
         if not budget_dict:
@@ -107,8 +1648,12 @@ def save_budget_csv(budget_dict):
             }
         
         df = pd.DataFrame(list(budget_dict.items()), columns=["Kategori", "Anggaran"])
-        # Save to CSV
-        df.to_csv(budget_file, index=False)
+        # Save to CSV (under the write lock, through a temp file so readers never see half a budget)
+        with store.write_lock():
+            tmp_path = budget_file + ".tmp"
+            df.to_csv(tmp_path, index=False)
+            os.replace(tmp_path, budget_file)
+            store.invalidate("budget", dict(budget_dict))
         print(f"Budget saved to {budget_file}")  # Debug print
         return True
     except Exception as e:
@@ -116,93 +1661,49 @@ def save_budget_csv(budget_dict):
         st.error(f"Error saving budget: {str(e)}")
         return False
 
-# Function to get historical average spending by category
-def get_historical_average_by_category(df, categories, months_back=3):
-    if df.empty or "Tanggal" not in df.columns:
+# Function to get historical monthly spending per subcategory ("mean", "median", "ewma",
+# "p25"/"p75"/"p90" or "total") over the months_back most recent months (None: all).
+# Works on raw transactions as well as on the monthly aggregates; the frame is not modified.
+def get_historical_average_by_category(df, categories, months_back=3, method="mean"):
+    if df.empty or not {"Tanggal", "date"} & set(df.columns):
         return {cat: 0.0 for cat in categories}
-    
-    df["Tanggal"] = pd.to_datetime(df["Tanggal"], errors='coerce')
-    df = df.dropna(subset=["Tanggal"]) 
-
-    df["Month"] = df["Tanggal"].dt.to_period("M")
-    recent_months = sorted(df["Month"].unique())[-months_back:]
-
-    # Filter to recent months and allowed categories
-    filtered_df = df[df["Month"].isin(recent_months) & df["Kategori"].isin(categories)]
+    if "Tanggal" in df.columns:
+        df = df.rename(columns=analysis_cols)
+        df = df.assign(date=pd.to_datetime(df["date"], errors="coerce")).dropna(subset=["date"])
 
-    # Group by category and compute average per month
-    averages = (
-        filtered_df.groupby("Kategori")["Jumlah (Rp)"]
-        .mean()
-        .to_dict()
-    )
+    stats = get_spending_stats(df, categories, months_back)
+    return {cat: round(float(stats.at[cat, method]), 2) for cat in categories}
 
-    return {cat: round(averages.get(cat, 0.0), 2) for cat in categories}
+# English column names used by the analysis helpers
+analysis_cols = {
+    "Tanggal": "date",
+    "Deskripsi": "description",
+    "Jumlah (Rp)": "amount",
+    "Kategori": "category",
+    "Sub-kategori": "subcategory",
+    "Metode Pembayaran": "payment_method",
+    "Catatan": "notes"
+}
 
-# Function to fetch transaction data for filtering
+# Function to fetch and prepare data for analysis, optionally limited to a date range
 def fetch_data(start_date=None, end_date=None):
-    if not os.path.exists(transactions_data):
-        return pd.DataFrame()
-    df = pd.read_csv(transactions_data)
-    df = df.rename(columns={
-        "Tanggal": "date",
-        "Jumlah (Rp)": "amount",
-        "Kategori": "category",
-        "Sub-kategori": "subcategory",
-        "Metode Pembayaran": "payment_method",
-        "Deskripsi": "description",
-        "Keterangan": "note"
-    })
-    df["date"] = pd.to_datetime(df["date"])
-    if start_date:
-        df = df[df["date"] >= pd.to_datetime(start_date)]
-    if end_date:
-        df = df[df["date"] <= pd.to_datetime(end_date)]
-    return df
-
-# Function to fetch and prepare data for analysis
-def fetch_data():
     try:
-        # Check if file exists
-        if not os.path.exists(transactions_data) or os.path.getsize(transactions_data) == 0:
+        store = get_store()
+        # Check if the ledger exists
+        if not store.exists():
             # Return empty DataFrame with expected columns
-            return pd.DataFrame(columns=["date", "description", "amount", "category", "subcategory", "payment_method", "notes"])
-        
-        # Read the CSV file
-        df = pd.read_csv(transactions_data)
+            return pd.DataFrame(columns=list(analysis_cols.values()))
         
-        # Return empty DataFrame if no data or columns
-        if df.empty or len(df.columns) == 0:
-            return pd.DataFrame(columns=["date", "description", "amount", "category", "subcategory", "payment_method", "notes"])
+        # Slice the typed, date-sorted ledger (base file merged with the journal) by binary search,
+        # or let the SQLite backend read the range through its date index
+        df = store.read_range(start_date, end_date)
         
         # Rename columns to English for consistency
-        df = df.rename(columns={
-            "Tanggal": "date",
-            "Deskripsi": "description",
-            "Jumlah (Rp)": "amount",
-            "Kategori": "category",
-            "Sub-kategori": "subcategory",
-            "Metode Pembayaran": "payment_method",
-            "Catatan": "notes"
-        })
-        
-        # Convert date column to datetime
-        df["date"] = pd.to_datetime(df["date"], errors="coerce")
-        
-        # Drop rows with invalid dates
-        df = df.dropna(subset=["date"])
-        
-        # Sort by date
-        df = df.sort_values("date", ascending=False)
-        
-        return df
+        return df.rename(columns=analysis_cols)
         
-    except pd.errors.EmptyDataError:
-        # Return empty DataFrame if file is empty
-        return pd.DataFrame(columns=["date", "description", "amount", "category", "subcategory", "payment_method", "notes"])
     except Exception as e:
         st.error(f"Error loading data: {str(e)}")
-        return pd.DataFrame(columns=["date", "description", "amount", "category", "subcategory", "payment_method", "notes"])
+        return pd.DataFrame(columns=list(analysis_cols.values()))
 
 # --- Financial Summary ---
 def get_financial_summary(df):
@@ -223,9 +1724,137 @@ def get_financial_summary(df):
         "balance": balance
     }
 
+# --- Cashflow ---
+# Vectorized kernels shared by the pages. They work on any frame with the English
+# analysis columns (date, category, subcategory, amount): raw transactions from
+# fetch_data() as well as the monthly/daily aggregates.
+
+# Function to get integer period ordinals of a datetime Series ("M": months, "Y": years since 1970)
+def period_ordinals(dates, freq="M"):
+    unit = "datetime64[M]" if freq == "M" else "datetime64[Y]"
+    return dates.to_numpy().astype(unit).astype("int64")
+
+# Function to sum several weight arrays per period in one bincount pass each;
+# returns the PeriodIndex of the periods that have rows and the sums for them
+def period_sums(dates, weights, freq="M", width=1, codes=None):
+    ordinals = period_ordinals(dates, freq)
+    first = ordinals.min()
+    slots = ordinals - first
+    if codes is not None:
+        # 2-D sums (period x code) flattened into one bincount
+        slots = slots * width + codes
+    n_periods = ordinals.max() - first + 1
+    counts = np.bincount(ordinals - first, minlength=n_periods)
+    present = np.flatnonzero(counts)
+    sums = [
+        np.bincount(slots, weights=w, minlength=n_periods * width).reshape(n_periods, width)[present]
+        for w in weights
+    ]
+    index = pd.PeriodIndex.from_ordinals(present + first, freq=freq, name="date")
+    return index, sums
+
+# Function to sum income, expense and net cashflow per period ("M" for months, "Y" for years)
+def get_cashflow(df, freq="M"):
+    if df.empty:
+        return pd.DataFrame(columns=["income", "expense", "cashflow"], dtype="float64")
+    amount = df["amount"].to_numpy(dtype="float64")
+    income = np.where((df["category"] == "Pendapatan").to_numpy(), amount, 0.0)
+    expense = np.where((df["category"] == "Pengeluaran").to_numpy(), amount, 0.0)
+    index, (income, expense) = period_sums(df["date"], [income, expense], freq)
+    cashflow = pd.DataFrame({"income": income[:, 0], "expense": expense[:, 0]}, index=index)
+    cashflow["cashflow"] = cashflow["income"] - cashflow["expense"]
+    return cashflow
+
+# Function to get income and expense per period in long format (date, category, amount)
+def get_income_vs_expense(df, freq="M"):
+    cashflow = get_cashflow(df, freq)
+    long_df = (
+        cashflow[["income", "expense"]]
+        .rename(columns={"income": "Pendapatan", "expense": "Pengeluaran"})
+        .rename_axis("date")
+        .reset_index()
+        .melt(id_vars="date", var_name="category", value_name="amount")
+    )
+    long_df["date"] = long_df["date"].dt.to_timestamp()
+    return long_df
+
+# Function to map a subcategory column to positions in a list (-1 when not in it);
+# categorical columns are mapped through their categories instead of row by row
+def subcategory_codes(values, subcategories):
+    lookup = pd.Index(subcategories)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        mapping = np.append(lookup.get_indexer(values.cat.categories), -1)
+        return mapping[values.cat.codes.to_numpy()]
+    return lookup.get_indexer(values)
+
+# Function to pivot spending per period x subcategory (missing subcategories are 0)
+def get_subcategory_breakdown(df, subcategories, freq="M", category="Pengeluaran"):
+    spend_df = df[(df["category"] == category).to_numpy()]
+    if spend_df.empty:
+        return pd.DataFrame(columns=subcategories, dtype="float64")
+    codes = subcategory_codes(spend_df["subcategory"], subcategories)
+    # Subcategories outside the list get their own (dropped) column
+    codes = np.where(codes < 0, len(subcategories), codes)
+    index, (sums,) = period_sums(
+        spend_df["date"], [spend_df["amount"].to_numpy(dtype="float64")], freq,
+        width=len(subcategories) + 1, codes=codes
+    )
+    return pd.DataFrame(sums[:, :len(subcategories)], index=index, columns=subcategories)
+
+# Function to get spending per month x subcategory over the months_back most recent months
+# (None: all). Every month from the first to the last month in the data is a row, so
+# months without spending in a subcategory count as 0.
+def get_monthly_spending(df, subcategories, months_back=None, category="Pengeluaran"):
+    if df.empty:
+        return pd.DataFrame(columns=subcategories, dtype="float64")
+    ordinals = period_ordinals(df["date"], "M")
+    months = pd.PeriodIndex.from_ordinals(np.arange(ordinals.min(), ordinals.max() + 1), freq="M", name="date")
+    spending = get_subcategory_breakdown(df, subcategories, "M", category).reindex(months, fill_value=0.0)
+    if months_back is not None:
+        spending = spending.iloc[-months_back:]
+    return spending
+
+# Function to get statistics of the monthly spending per subcategory: number of months,
+# total, mean, median, percentiles (p<q> columns) and an exponentially weighted mean
+# (ewma, recent months weigh more). On the monthly aggregates the cost depends on the
+# number of months, not on the number of transactions.
+def get_spending_stats(df, subcategories, months_back=None, percentiles=(25, 75, 90), ewma_span=3,
+                       category="Pengeluaran"):
+    spending = get_monthly_spending(df, subcategories, months_back, category)
+    columns = ["months", "total", "mean", "median"] + [f"p{q}" for q in percentiles] + ["ewma"]
+    if spending.empty:
+        return pd.DataFrame(0.0, index=subcategories, columns=columns)
+    values = spending.to_numpy()
+    stats = pd.DataFrame({
+        "months": float(len(values)),
+        "total": values.sum(axis=0),
+        "mean": values.mean(axis=0),
+        "median": np.median(values, axis=0),
+    }, index=subcategories)
+    for q, column in zip(percentiles, np.percentile(values, percentiles, axis=0)):
+        stats[f"p{q}"] = column
+    stats["ewma"] = spending.ewm(span=ewma_span).mean().iloc[-1].to_numpy()
+    return stats[columns]
+
+# Function to get rolling monthly spending per subcategory: "mean", "median" or "sum" over
+# the last window months, or "ewma" (exponentially weighted with span=window)
+def get_rolling_spending(df, subcategories, window=3, method="mean", category="Pengeluaran"):
+    spending = get_monthly_spending(df, subcategories, category=category)
+    if method == "ewma":
+        return spending.ewm(span=window).mean()
+    return spending.rolling(window, min_periods=1).agg(method)
+
+# Function to parse the budget file (None when it has no columns)
+def read_budget_file(budget_file):
+    df = pd.read_csv(budget_file)
+    if len(df.columns) == 0:
+        return None
+    return dict(zip(df["Kategori"], df["Anggaran"]))
+
 # Function to load budget from CSV
 def load_budget_csv():
-    budget_file = os.path.join(DATA_DIR, "budget.csv")
+    store = get_store()
+    budget_file = store.budget_path
     default_budget = {
         "Makanan": 0,
         "Transport": 0,
@@ -237,11 +1866,11 @@ def load_budget_csv():
     
     try:
         if os.path.exists(budget_file) and os.path.getsize(budget_file) > 0:
-            df = pd.read_csv(budget_file)
-            if len(df.columns) == 0:  # File exists but is empty or corrupted
+            budget = store.cached("budget", store.budget_key(), lambda: read_budget_file(budget_file))
+            if budget is None:  # File exists but is empty or corrupted
                 save_budget_csv(default_budget)  # Create new file with default values
                 return default_budget
-            return dict(zip(df["Kategori"], df["Anggaran"]))
+            return dict(budget)
         else:
             # Create new budget file with default values
             save_budget_csv(default_budget)
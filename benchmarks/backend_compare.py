@@ -0,0 +1,110 @@
+# Comparison of the ledger storage backends (csv, arrow, sqlite)
+#
+# Writes one random ledger of --rows transactions with every backend into its own
+# temporary directory and times, each on a fresh store (nothing cached):
+#   load               the whole ledger,
+#   month filter       one month through read_range (the SQLite date index when available),
+#   aggregates         the monthly/daily aggregates,
+# and on the loaded store the median time of --inserts single-row appends. The row
+# counts, the month and the aggregate totals are compared between the backends; exits
+# with status 1 if they differ.
+#
+#   python benchmarks/backend_compare.py [--rows N] [--inserts N] [--backends NAME ...] [--seed N]
+
+# Import necessary libraries
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app_utils import STORAGE_BACKENDS, TransactionStore
+
+SUBCATEGORIES = ["Makanan", "Transport", "Belanja", "Hiburan", "Tabungan", "Lainnya"]
+PAYMENT_METHODS = ["Cash", "Debit", "Kredit", "E-Wallet"]
+
+# Function to build a random ledger of n rows over ten years
+def random_ledger(n, rng):
+    return pd.DataFrame({
+        "Tanggal": pd.Timestamp("2015-01-01") + pd.to_timedelta(rng.integers(0, 3650, n), unit="D"),
+        "Deskripsi": pd.Series(rng.integers(0, 5000, n)).map("Transaksi {}".format),
+        "Jumlah (Rp)": rng.integers(1, 2000, n).astype("float64") * 1000,
+        "Kategori": rng.choice(["Pendapatan", "Pengeluaran"], n, p=[0.1, 0.9]),
+        "Sub-kategori": rng.choice(SUBCATEGORIES, n),
+        "Metode Pembayaran": rng.choice(PAYMENT_METHODS, n),
+        "Catatan": "",
+    })
+
+# Function to time one call (seconds) and return its result
+def timed(run):
+    started = time.perf_counter()
+    result = run()
+    return time.perf_counter() - started, result
+
+# Function to measure one backend on a copy of the ledger; returns timings and checked values
+def measure(name, df, month, inserts):
+    data_dir = tempfile.mkdtemp(prefix=f"ledger-{name}-")
+    try:
+        write_time, _ = timed(lambda: TransactionStore(data_dir, name).write(df))
+        load_time, ledger = timed(lambda: TransactionStore(data_dir, name).load())
+        month_time, month_df = timed(lambda: TransactionStore(data_dir, name).read_range(*month))
+        aggregates_time, aggregates = timed(lambda: TransactionStore(data_dir, name).aggregates())
+
+        store = TransactionStore(data_dir, name)
+        store.load()
+        row = df.iloc[0].to_dict()
+        insert_times = [timed(lambda: store.append([row]))[0] for _ in range(inserts)]
+        return {
+            "backend": store.backend.name,
+            "write": write_time,
+            "load": load_time,
+            "month": month_time,
+            "aggregates": aggregates_time,
+            "insert": statistics.median(insert_times),
+            "rows": len(ledger),
+            "month_rows": len(month_df),
+            "month_total": month_df["Jumlah (Rp)"].sum(),
+            "aggregates_total": sum(total for total, _ in aggregates.monthly.values()),
+        }
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the ledger storage backends")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--inserts", type=int, default=20, help="single-row appends timed per backend")
+    parser.add_argument("--backends", nargs="+", default=list(STORAGE_BACKENDS), choices=list(STORAGE_BACKENDS))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    df = random_ledger(args.rows, np.random.default_rng(args.seed))
+    month = ("2020-06-01", "2020-06-30")
+    results = [measure(name, df, month, args.inserts) for name in args.backends]
+
+    print(f"{args.rows:,} rows, month filter {month[0]} - {month[1]}")
+    print(f"{'backend':<8} {'write':>8} {'load':>8} {'month':>8} {'aggregates':>11} {'insert':>9}")
+    for r in results:
+        print(f"{r['backend']:<8} {r['write']:>7.2f}s {r['load']:>7.2f}s {r['month']:>7.2f}s "
+              f"{r['aggregates']:>10.2f}s {r['insert'] * 1000:>7.1f}ms")
+
+    failures = []
+    first = results[0]
+    for r in results[1:]:
+        for key in ["rows", "month_rows", "month_total", "aggregates_total"]:
+            if not np.isclose(r[key], first[key]):
+                failures.append(f"{r['backend']}: {key} is {r[key]}, {first['backend']} has {first[key]}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK: all backends hold the same ledger")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+# Corpus, fuzz and benchmark run for the AI budget table parser
+#
+# budget_replies.jsonl holds AI replies in the formats the budget prompt gets back
+# (tables with and without a row number column, bold cells, "Rp1.500.000,00", "2,5 juta",
+# "600rb", English replies, tables in lists, replies without a table) with the budget and
+# percentages expected from each. The run:
+#   1. parses every reply whole and streamed in random chunks and compares the result
+#      with the expected one,
+#   2. fuzzes the replies (random chunking, spacing, bold markers, cut-off endings,
+#      shuffled lines) and checks that the parser never fails and that streaming gives
+#      the same result as parsing the whole text,
+#   3. times the parser on long replies (the corpus repeated) and reports the throughput.
+# Exits with status 1 if a check fails.
+#
+#   python benchmarks/budget_parser_corpus.py [--fuzz N] [--repeat N] [--seed N]
+
+# Import necessary libraries
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from budget_parser import BudgetTableParser, parse_budget_table
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "budget_replies.jsonl")
+
+# Same categories and synonyms as the budget page
+SUBCATEGORIES = ["Makanan", "Transport", "Belanja", "Hiburan", "Tabungan", "Lainnya"]
+category_map = {
+    "food": "Makanan", "makanan": "Makanan", "transport": "Transport", "transportasi": "Transport",
+    "shopping": "Belanja", "belanja": "Belanja", "entertainment": "Hiburan", "hiburan": "Hiburan",
+    "savings": "Tabungan", "tabungan": "Tabungan", "other": "Lainnya", "misc": "Lainnya", "lainnya": "Lainnya"
+}
+
+# Function to load the corpus
+def load_corpus(path=CORPUS_PATH):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+# Function to split a text into random chunks, like a streamed reply
+def random_chunks(text, rng, max_chunk=40):
+    chunks, start = [], 0
+    while start < len(text):
+        end = start + rng.randint(1, max_chunk)
+        chunks.append(text[start:end])
+        start = end
+    return chunks
+
+# Function to parse a reply fed in chunks; returns the budget and the percentages
+def parse_streamed(chunks):
+    parser = BudgetTableParser(SUBCATEGORIES, category_map)
+    for chunk in chunks:
+        parser.feed(chunk)
+    parser.close()
+    return parser.budget, parser.percentages
+
+# Function to make a random variant of a reply
+def mutate(text, rng):
+    lines = text.split("\n")
+    mutation = rng.choice(["spacing", "bold", "cut", "shuffle", "crlf", "noise"])
+    if mutation == "spacing":
+        lines = [line.replace("|", rng.choice(["|", " | ", "|  ", "\t|"])) for line in lines]
+    elif mutation == "bold":
+        lines = [line.replace("| ", "| **") if rng.random() < 0.5 else line for line in lines]
+    elif mutation == "cut":
+        return text[:rng.randint(0, len(text))]
+    elif mutation == "shuffle":
+        rng.shuffle(lines)
+    elif mutation == "crlf":
+        return text.replace("\n", "\r\n")
+    else:
+        noise = "".join(rng.choice("|-:*.,%Rp0123456789 abcjutarb\n") for _ in range(rng.randint(1, 80)))
+        position = rng.randint(0, len(text))
+        return text[:position] + noise + text[position:]
+    return "\n".join(lines)
+
+# Function to compare parsed values with the expected ones (amounts within a rupiah)
+def matches(parsed, expected):
+    return parsed.keys() == expected.keys() and all(abs(parsed[key] - expected[key]) < 1 for key in expected)
+
+def main():
+    parser = argparse.ArgumentParser(description="Corpus, fuzz and benchmark run for the AI budget table parser")
+    parser.add_argument("--fuzz", type=int, default=2000, help="number of fuzzed replies")
+    parser.add_argument("--repeat", type=int, default=200, help="times the corpus is repeated in the long reply")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = load_corpus()
+    failures = []
+
+    # 1. Expected results, whole and streamed
+    for entry in corpus:
+        for mode, (budget, percentages) in [
+            ("whole", parse_budget_table(entry["reply"], SUBCATEGORIES, category_map)),
+            ("streamed", parse_streamed(random_chunks(entry["reply"], rng))),
+        ]:
+            if not matches(budget, entry["expected"]):
+                failures.append(f"{entry['name']} ({mode}): budget {budget}, expected {entry['expected']}")
+            elif entry.get("percentages") and not matches(
+                {key: value for key, value in percentages.items() if value is not None}, entry["percentages"]
+            ):
+                failures.append(f"{entry['name']} ({mode}): percentages {percentages}, expected {entry['percentages']}")
+    print(f"Corpus: {len(corpus)} replies, {len(failures)} mismatches")
+
+    # 2. Fuzzing: no exceptions, streaming equals parsing the whole text
+    fuzz_failures = 0
+    for i in range(args.fuzz):
+        text = mutate(rng.choice(corpus)["reply"], rng)
+        try:
+            whole = parse_budget_table(text, SUBCATEGORIES, category_map)
+            streamed = parse_streamed(random_chunks(text, rng))
+        except Exception as e:
+            failures.append(f"fuzz {i}: {type(e).__name__}: {e}\n{text!r}")
+            fuzz_failures += 1
+            continue
+        if whole != streamed:
+            failures.append(f"fuzz {i}: streamed result differs\n{text!r}")
+            fuzz_failures += 1
+    print(f"Fuzz: {args.fuzz} replies, {fuzz_failures} failures")
+
+    # 3. Throughput on a long reply, whole and streamed in token-sized chunks
+    long_reply = "\n".join(entry["reply"] for entry in corpus) * args.repeat
+    n_lines = long_reply.count("\n")
+    long_chunks = random_chunks(long_reply, random.Random(args.seed), max_chunk=8)
+    for mode, run in [
+        ("whole", lambda: parse_budget_table(long_reply, SUBCATEGORIES, category_map)),
+        ("streamed", lambda: parse_streamed(long_chunks)),
+    ]:
+        started = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - started
+        print(f"Benchmark ({mode}): {len(long_reply) / 1e6:.2f} MB, {n_lines} lines in {elapsed * 1000:.1f} ms "
+              f"({n_lines / elapsed:,.0f} lines/s)")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
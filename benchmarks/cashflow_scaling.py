@@ -0,0 +1,89 @@
+# Scaling benchmark for the cashflow kernels
+#
+# Builds random ledgers (in the analysis columns: date, category, subcategory, amount) of
+# each --sizes row count and times the groupby.apply cashflow the analysis page used
+# before against get_cashflow() and get_subcategory_breakdown(). The results are compared
+# with the groupby versions at every size; exits with status 1 if they differ.
+#
+#   python benchmarks/cashflow_scaling.py [--sizes N ...] [--runs N] [--seed N]
+
+# Import necessary libraries
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app_utils import get_cashflow, get_subcategory_breakdown
+
+SUBCATEGORIES = ["Makanan", "Transport", "Belanja", "Hiburan", "Tabungan", "Lainnya"]
+
+# Function to build a random ledger of n rows over ten years
+def random_ledger(n, rng):
+    return pd.DataFrame({
+        "date": pd.Timestamp("2015-01-01") + pd.to_timedelta(rng.integers(0, 3650, n), unit="D"),
+        "category": pd.Categorical(rng.choice(["Pendapatan", "Pengeluaran"], n, p=[0.1, 0.9])),
+        "subcategory": pd.Categorical(rng.choice(SUBCATEGORIES + ["Gaji"], n)),
+        "amount": rng.integers(1, 2000, n).astype("float64") * 1000,
+    })
+
+# The monthly cashflow as the analysis page computed it before the kernels
+def groupby_cashflow(df):
+    return df.groupby(df["date"].dt.to_period("M")).apply(
+        lambda x: x[x["category"] == "Pendapatan"]["amount"].sum() - x[x["category"] == "Pengeluaran"]["amount"].sum()
+    )
+
+# The subcategory pivot as the analysis page computed it before the kernels
+def groupby_breakdown(df):
+    return (
+        df[df["category"] == "Pengeluaran"]
+        .groupby([df["date"].dt.to_period("M"), "subcategory"], observed=True)["amount"]
+        .sum()
+        .unstack(fill_value=0)
+        .reindex(columns=SUBCATEGORIES, fill_value=0)
+    )
+
+# Function to get the fastest of several runs (seconds) and the last result
+def timed(run, runs):
+    best, result = float("inf"), None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = run()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling benchmark for the cashflow kernels")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--runs", type=int, default=3, help="runs per measurement (the fastest one counts)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    failures = []
+    print(f"{'rows':>12} {'groupby.apply':>14} {'get_cashflow':>13} {'groupby pivot':>14} {'breakdown':>10}")
+    for n in args.sizes:
+        df = random_ledger(n, rng)
+        old_time, old_cashflow = timed(lambda: groupby_cashflow(df), args.runs)
+        new_time, new_cashflow = timed(lambda: get_cashflow(df, freq="M")["cashflow"], args.runs)
+        old_pivot_time, old_pivot = timed(lambda: groupby_breakdown(df), args.runs)
+        pivot_time, pivot = timed(lambda: get_subcategory_breakdown(df, SUBCATEGORIES, "M"), args.runs)
+        print(f"{n:>12,} {old_time:>12.3f} s {new_time:>11.3f} s {old_pivot_time:>12.3f} s {pivot_time:>8.3f} s")
+
+        if not np.allclose(new_cashflow.to_numpy(), old_cashflow.reindex(new_cashflow.index).to_numpy()):
+            failures.append(f"{n} rows: get_cashflow differs from the groupby cashflow")
+        if not np.allclose(pivot.to_numpy(), old_pivot.reindex(pivot.index, fill_value=0).to_numpy()):
+            failures.append(f"{n} rows: get_subcategory_breakdown differs from the groupby pivot")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK: results match the groupby versions")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
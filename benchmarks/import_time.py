@@ -0,0 +1,80 @@
+# Startup import time check for Halaman_Utama.py
+#
+# Runs the top-level imports of the page under `python -X importtime` (the rest of the
+# page is not executed, so no ledger is read), sums the cumulative time of the
+# top-level modules (interpreter startup included) and exits with status 1 if it is
+# above the budget or if one of the heavy optional dependencies is imported at startup.
+#
+#   python benchmarks/import_time.py [--budget SECONDS] [--runs N]
+
+# Import necessary libraries
+import os
+import re
+import ast
+import sys
+import argparse
+import subprocess
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+PAGE_PATH = os.path.join(REPO_DIR, "Halaman_Utama.py")
+
+# Startup import time allowed for the page (seconds)
+IMPORT_TIME_BUDGET = 2.0
+# Modules that must only be imported when first used (plotly and pyarrow are not listed,
+# streamlit itself imports them)
+LAZY_MODULES = ["transformers", "torch", "matplotlib", "requests"]
+
+# "import time: self [us] | cumulative | imported package" lines; nesting is shown by indentation
+importtime_pattern = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+
+# Function to get the top-level import statements of a script as source code
+def startup_imports(path):
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+# Function to run the imports in a fresh interpreter; returns the total time (seconds) and
+# the names of all imported modules
+def measure(code):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Imports failed:\n{result.stderr}")
+    total, modules = 0, []
+    for line in result.stderr.splitlines():
+        match = importtime_pattern.match(line)
+        if match is None:
+            continue
+        modules.append(match.group(4))
+        # Only top-level modules: the cumulative time already contains their imports
+        if not match.group(3):
+            total += int(match.group(2))
+    return total / 1e6, modules
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the startup import time of Halaman_Utama.py")
+    parser.add_argument("--budget", type=float, default=IMPORT_TIME_BUDGET, help="allowed import time in seconds")
+    parser.add_argument("--runs", type=int, default=3, help="number of runs (the fastest one counts)")
+    args = parser.parse_args()
+
+    code = startup_imports(PAGE_PATH)
+    runs = [measure(code) for _ in range(args.runs)]
+    total, modules = min(runs)
+    print(f"Startup imports of {os.path.basename(PAGE_PATH)}: {total:.3f} s (budget {args.budget:.3f} s)")
+
+    eager = sorted({name.split(".")[0] for name in modules} & set(LAZY_MODULES))
+    failed = False
+    if eager:
+        print(f"FAIL: imported at startup: {', '.join(eager)}")
+        failed = True
+    if total > args.budget:
+        print(f"FAIL: import time is {total - args.budget:.3f} s over the budget")
+        failed = True
+    if not failed:
+        print("OK")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+# Regression check for merging saved changes into the cached ledger
+#
+# Runs change sets against a fresh store on a temporary copy of data/ and checks after
+# every save that the cached ledger has the row ids read back from the files, is sorted
+# by date (descending) and keeps its categorical columns:
+#   1. a bulk delete (more cuts than MERGE_MAX_SLICES) followed by an append,
+#   2. rows dated with other datetime units (seconds, microseconds) than the ledger,
+#   3. a bulk add, edit and delete in one change set.
+# Exits with status 1 if a check fails.
+#
+#   python benchmarks/ledger_merge_check.py [--backend NAME] [--seed N]
+
+# Import necessary libraries
+import os
+import sys
+import shutil
+import random
+import argparse
+import tempfile
+
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app_utils import DATA_DIR, MERGE_MAX_SLICES, TransactionStore, categorical_cols, normalize_ledger
+
+# Function to build a new transaction on the given date
+def check_row(date, i):
+    return {
+        "Tanggal": date,
+        "Deskripsi": f"merge check {i}",
+        "Jumlah (Rp)": float(1000 + i),
+        "Kategori": "Pengeluaran",
+        "Sub-kategori": "Makanan",
+        "Metode Pembayaran": "Cash",
+        "Catatan": ""
+    }
+
+# Function to check the cached ledger after a save; returns the failures
+def check_ledger(store, data_dir, backend, step):
+    failures = []
+    ledger = store.load()
+    for col in categorical_cols:
+        if not isinstance(ledger[col].dtype, pd.CategoricalDtype):
+            failures.append(f"{step}: {col} is {ledger[col].dtype}, not category")
+    if not ledger["Tanggal"].is_monotonic_decreasing:
+        failures.append(f"{step}: ledger is not sorted by date")
+    try:
+        store.index()
+    except Exception as e:
+        failures.append(f"{step}: ledger index failed: {type(e).__name__}: {e}")
+    # A fresh store reads the same rows back from the files
+    reread = TransactionStore(data_dir, backend).load()
+    if sorted(reread.index) != sorted(ledger.index):
+        failures.append(f"{step}: cached ledger has other row ids than the files")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Regression check for merging saved changes into the cached ledger")
+    parser.add_argument("--backend", default=None, help="ledger backend (default: LEDGER_BACKEND)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    data_dir = tempfile.mkdtemp(prefix="ledger-merge-")
+    for name in ["transactions.csv", "budget.csv"]:
+        if os.path.exists(os.path.join(DATA_DIR, name)):
+            shutil.copy(os.path.join(DATA_DIR, name), data_dir)
+    store = TransactionStore(data_dir, args.backend)
+    failures = []
+
+    # 1. Bulk delete of scattered rows (one cut per row), then an append
+    ids = list(store.load().index)
+    deleted = rng.sample(ids, min(len(ids) // 2, MERGE_MAX_SLICES))
+    store.apply_changes(deleted=deleted)
+    failures += check_ledger(store, data_dir, args.backend, f"bulk delete of {len(deleted)} rows")
+    store.append([check_row("2024-02-15", 0)])
+    failures += check_ledger(store, data_dir, args.backend, "append after the bulk delete")
+
+    # 2. New rows with datetime units other than the ledger's
+    for i, unit in enumerate(["s", "us", "ns"], start=1):
+        rows = normalize_ledger(pd.DataFrame([check_row("2024-01-01", i), check_row("2024-02-15", i)]))
+        rows["Tanggal"] = rows["Tanggal"].astype(f"datetime64[{unit}]")
+        store.apply_changes(added=rows)
+        failures += check_ledger(store, data_dir, args.backend, f"append with datetime64[{unit}] dates")
+
+    # 3. Bulk add, edit and delete in one change set
+    ids = list(store.load().index)
+    added = normalize_ledger(pd.DataFrame([
+        check_row(f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", 100 + i) for i in range(200)
+    ]))
+    edited = {row_id: {"Catatan": "merge check edit"} for row_id in rng.sample(ids, min(len(ids) // 4, 50))}
+    deleted = rng.sample([row_id for row_id in ids if row_id not in edited], min(len(ids) // 4, 50))
+    store.apply_changes(added=added, edited=edited, deleted=deleted)
+    failures += check_ledger(store, data_dir, args.backend, "bulk add, edit and delete")
+    notes = store.load().loc[list(edited), "Catatan"]
+    if not (notes == "merge check edit").all():
+        failures.append("bulk add, edit and delete: edits were lost")
+
+    shutil.rmtree(data_dir, ignore_errors=True)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
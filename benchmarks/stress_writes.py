@@ -0,0 +1,150 @@
+# Concurrent write stress test for the ledger store
+#
+# Starts --processes writer processes with --threads threads each against one data
+# directory (a temporary copy of data/ by default). Every thread appends --rows single
+# transactions and, every --edit-every rows, edits one of its own rows against the ledger
+# version it read first (optimistic save, retried when rejected with LedgerConflictError).
+# Afterwards the ledger is read by a fresh store and checked: every appended row is there
+# once, every accepted edit is kept and the ledger version counts every accepted save.
+# Exits with status 1 if a check fails.
+#
+#   python benchmarks/stress_writes.py [--processes N] [--threads N] [--rows N] [--backend NAME]
+
+# Import necessary libraries
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import multiprocessing as mp
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Function to build the transaction appended by one writer thread
+def stress_row(writer, i):
+    return {
+        "Tanggal": f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+        "Deskripsi": f"stress {writer} {i}",
+        "Jumlah (Rp)": float(i + 1),
+        "Kategori": "Pengeluaran",
+        "Sub-kategori": "Makanan",
+        "Metode Pembayaran": "Cash",
+        "Catatan": ""
+    }
+
+# Function to run the writer threads of one process; puts its counts on the queue
+def run_writer_process(data_dir, backend, process_id, threads, rows, edit_every, edit_retries, results):
+    from app_utils import TransactionStore, LedgerConflictError
+
+    store = TransactionStore(data_dir, backend)
+    counts = {"appends": 0, "edits": 0, "conflicts": 0, "edited": []}
+    counts_lock = threading.Lock()
+
+    def run_thread(thread_id):
+        writer = f"{process_id}.{thread_id}"
+        for i in range(rows):
+            store.append([stress_row(writer, i)])
+            with counts_lock:
+                counts["appends"] += 1
+            if not edit_every or (i + 1) % edit_every:
+                continue
+            # A stale edit is made again on the current ledger, like a user reloading the page
+            note = f"edit {writer} {i}"
+            for _ in range(edit_retries):
+                version = store.ledger_version()
+                ledger = store.load()
+                own_rows = ledger.index[(ledger["Deskripsi"] == f"stress {writer} {i}").to_numpy()]
+                try:
+                    store.apply_changes(edited={int(own_rows[0]): {"Catatan": note}}, expected_version=version)
+                except LedgerConflictError:
+                    with counts_lock:
+                        counts["conflicts"] += 1
+                    continue
+                with counts_lock:
+                    counts["edits"] += 1
+                    counts["edited"].append((f"stress {writer} {i}", note))
+                break
+
+    workers = [threading.Thread(target=run_thread, args=(thread_id,)) for thread_id in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    results.put(counts)
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent write stress test for the ledger store")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=2, help="writer threads per process")
+    parser.add_argument("--rows", type=int, default=100, help="rows appended by every thread")
+    parser.add_argument("--edit-every", type=int, default=10, help="edit one own row every N appends (0: no edits)")
+    parser.add_argument("--edit-retries", type=int, default=5, help="attempts per edit when it is rejected as stale")
+    parser.add_argument("--backend", default=None, help="ledger backend (default: LEDGER_BACKEND)")
+    parser.add_argument("--data-dir", default=None, help="data directory (default: a temporary copy of data/)")
+    args = parser.parse_args()
+
+    from app_utils import DATA_DIR, TransactionStore
+
+    data_dir = args.data_dir
+    if data_dir is None:
+        data_dir = tempfile.mkdtemp(prefix="ledger-stress-")
+        for name in ["transactions.csv", "budget.csv"]:
+            if os.path.exists(os.path.join(DATA_DIR, name)):
+                shutil.copy(os.path.join(DATA_DIR, name), data_dir)
+    store = TransactionStore(data_dir, args.backend)
+    rows_before = len(store.load())
+    version_before = store.ledger_version()
+
+    results = mp.Queue()
+    processes = [
+        mp.Process(target=run_writer_process,
+                   args=(data_dir, args.backend, process_id, args.threads, args.rows, args.edit_every,
+                         args.edit_retries, results))
+        for process_id in range(args.processes)
+    ]
+    started = time.time()
+    for process in processes:
+        process.start()
+    counts = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.time() - started
+
+    appends = sum(c["appends"] for c in counts)
+    edits = sum(c["edits"] for c in counts)
+    conflicts = sum(c["conflicts"] for c in counts)
+    print(f"Data directory: {data_dir} ({store.backend.name} backend)")
+    print(f"{args.processes} processes x {args.threads} threads: {appends} appends, "
+          f"{edits} edits, {conflicts} stale edits rejected")
+    print(f"Write throughput: {(appends + edits) / elapsed:.1f} saves/s ({elapsed:.2f} s)")
+
+    # A fresh store reads everything back from the files
+    df = TransactionStore(data_dir, args.backend).load()
+    stress_df = df[df["Deskripsi"].str.startswith("stress ")]
+    failures = []
+    if len(df) != rows_before + appends:
+        failures.append(f"ledger has {len(df)} rows, expected {rows_before + appends}")
+    if stress_df["Deskripsi"].nunique() != appends or len(stress_df) != appends:
+        failures.append(f"{appends} rows appended, {stress_df['Deskripsi'].nunique()} distinct found")
+    if not df.index.is_unique:
+        failures.append("row ids are not unique")
+    notes = dict(zip(stress_df["Deskripsi"], stress_df["Catatan"]))
+    lost_edits = [description for c in counts for description, note in c["edited"] if notes.get(description) != note]
+    if lost_edits:
+        failures.append(f"{len(lost_edits)} accepted edits were lost")
+    version = store.ledger_version()
+    if version != version_before + appends + edits:
+        failures.append(f"ledger version is {version}, expected {version_before + appends + edits}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK: no rows or edits lost")
+    if args.data_dir is None:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+# Import necessary libraries
+import re
+import functools
+from collections import deque
+
+# Patterns are compiled once; every table line is scanned a single time
+table_line_pattern = re.compile(r"^[ \t]*\|.*$", re.MULTILINE)
+separator_line_pattern = re.compile(r"^\s*\|[\s\-:|]+\|?\s*$")
+# A cell holding only a row number ("1", "12.")
+row_number_pattern = re.compile(r"^\d{1,3}\.?$")
+number_pattern = re.compile(r"(\d[\d.,]*)\s*(juta|jt|ribu|rb|k)?(?![a-z])", re.IGNORECASE)
+currency_pattern = re.compile(r"rp\.?|idr|\$", re.IGNORECASE)
+
+# Multipliers of the Indonesian short forms ("1,5 juta", "500rb")
+number_suffixes = {"juta": 1e6, "jt": 1e6, "ribu": 1e3, "rb": 1e3, "k": 1e3}
+
+# Aho-Corasick automaton over a set of keywords: all keywords found in a text
+# are reported in one pass over it, however many keywords there are.
+class KeywordMatcher:
+    # keywords: {keyword: value}; keywords are matched case-insensitively
+    def __init__(self, keywords):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for keyword, value in keywords.items():
+            self._add(keyword.lower(), value)
+        self._build_failure_links()
+
+    def _add(self, keyword, value):
+        state = 0
+        for char in keyword:
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[state][char] = len(self.goto) - 1
+            state = self.goto[state][char]
+        self.output[state].append(value)
+
+    def _build_failure_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    # Values of all keywords found in text, in the order their matches end
+    def find(self, text):
+        state = 0
+        found = []
+        for char in text.lower():
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            if self.output[state]:
+                found.extend(self.output[state])
+        return found
+
+# Function to parse an amount written the Indonesian or the English way:
+# "Rp1.500.000", "1.500.000,50", "1,500,000.50", "Rp 1,5 juta", "500rb", "12,5%".
+# Returns None if the text holds no number. Replies repeat the same cells, so results are memoized.
+@functools.lru_cache(maxsize=4096)
+def parse_amount(text):
+    match = number_pattern.search(currency_pattern.sub("", text))
+    if match is None:
+        return None
+    digits, suffix = match.group(1).rstrip(".,"), match.group(2)
+    dots, commas = digits.count("."), digits.count(",")
+    if dots and commas:
+        # The separator that comes last is the decimal one
+        decimal = "," if digits.rfind(",") > digits.rfind(".") else "."
+    elif dots + commas == 1:
+        # One separator followed by exactly three digits groups thousands ("3.000")
+        separator = "." if dots else ","
+        decimal = None if len(digits) - digits.index(separator) - 1 == 3 else separator
+    else:
+        # No separator, or one kind repeated ("1.500.000"): thousands only
+        decimal = None
+    thousands = {".", ","} - {decimal}
+    for separator in thousands:
+        digits = digits.replace(separator, "")
+    if decimal:
+        digits = digits.replace(decimal, ".")
+    value = float(digits)
+    if suffix:
+        value *= number_suffixes[suffix.lower()]
+    return value
+
+# Parser for the markdown budget table in an AI reply. Text can be fed incrementally
+# (as it streams in); every complete table line is parsed once, so rows are available
+# before the reply ends. Each row gives a category, an amount and an optional percentage.
+class BudgetTableParser:
+    # categories: allowed category names; synonyms: {lowercase keyword: category}.
+    # A category name found in a row wins over a synonym, earlier names over later ones.
+    def __init__(self, categories, synonyms):
+        keywords = {}
+        for rank, category in enumerate(categories):
+            keywords.setdefault(category.lower(), (rank, category))
+        for rank, (keyword, category) in enumerate(synonyms.items(), start=len(categories)):
+            keywords.setdefault(keyword.lower(), (rank, category))
+        self.matcher = KeywordMatcher(keywords)
+        self._cell_categories = {}
+        self.budget = {}
+        self.percentages = {}
+        self._pending = ""
+
+    # Feed more reply text; returns the rows completed by it as (category, amount, percent)
+    def feed(self, text):
+        text = self._pending + text
+        end = text.rfind("\n") + 1
+        self._pending = text[end:]
+        # Only table lines are looked at; prose between tables is skipped by the regex engine
+        rows = (self.parse_line(match.group()) for match in table_line_pattern.finditer(text, 0, end))
+        return [row for row in rows if row is not None]
+
+    # Parse what is left after the reply ended
+    def close(self):
+        row = self.parse_line(self._pending)
+        self._pending = ""
+        return [row] if row is not None else []
+
+    # Category named in a cell (memoized per distinct cell text), or None
+    def _category(self, cell):
+        if cell not in self._cell_categories:
+            matches = self.matcher.find(cell)
+            self._cell_categories[cell] = min(matches)[1] if matches else None
+        return self._cell_categories[cell]
+
+    # Parse one table line into (category, amount, percent), or None for any other line
+    def parse_line(self, line):
+        if not table_line_pattern.match(line) or separator_line_pattern.match(line):
+            return None
+        line = line.strip()
+        # The closing pipe is optional in markdown
+        cols = [c.strip(" *") for c in line.split("|")[1:-1 if line.endswith("|") else None]]
+        if len(cols) < 2:
+            return None
+        # The category is the first cell naming one (usually the first column)
+        for position, col in enumerate(cols):
+            category = self._category(col)
+            if category is not None:
+                break
+        else:
+            return None
+
+        # The amount is the first number that is not a percentage, looked for in the cells
+        # after the category first; cells before it are only used when they are not a row
+        # number ("| 1 | Makanan | - |" has no amount)
+        amount = percent = None
+        before = [col for col in cols[:position] if not row_number_pattern.match(col)]
+        for col in cols[position + 1:] + before:
+            if "%" in col:
+                if percent is None:
+                    percent = parse_amount(col)
+            elif amount is None:
+                amount = parse_amount(col)
+        if amount is None:
+            return None
+        self.budget[category] = amount
+        self.percentages[category] = percent
+        return category, amount, percent
+
+# Function to parse a complete reply; returns the budget and the percentages per category
+def parse_budget_table(text, categories, synonyms):
+    parser = BudgetTableParser(categories, synonyms)
+    parser.feed(text)
+    parser.close()
+    return parser.budget, parser.percentages
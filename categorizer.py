@@ -0,0 +1,212 @@
+# Import necessary libraries
+import re
+import numpy as np
+import pandas as pd
+
+from budget_parser import KeywordMatcher
+
+# Keyword rules: a keyword found in the description sets (Kategori, Sub-kategori).
+# Descriptions are matched lowercased with every non-letter run turned into one space
+# and a space on both ends, so " tol " only matches the whole word.
+CATEGORY_KEYWORDS = {
+    "gaji": ("Pendapatan", "Gaji"), "salary": ("Pendapatan", "Gaji"), "payroll": ("Pendapatan", "Gaji"),
+    "bonus": ("Pendapatan", "Bonus"), " thr ": ("Pendapatan", "Bonus"), "insentif": ("Pendapatan", "Bonus"),
+    "makan": ("Pengeluaran", "Makanan"), "kopi": ("Pengeluaran", "Makanan"), "resto": ("Pengeluaran", "Makanan"),
+    "gofood": ("Pengeluaran", "Makanan"), "grabfood": ("Pengeluaran", "Makanan"), "shopeefood": ("Pengeluaran", "Makanan"),
+    "warung": ("Pengeluaran", "Makanan"), "bakso": ("Pengeluaran", "Makanan"), "nasi": ("Pengeluaran", "Makanan"),
+    "bensin": ("Pengeluaran", "Transport"), "pertamina": ("Pengeluaran", "Transport"), " tol ": ("Pengeluaran", "Transport"),
+    "parkir": ("Pengeluaran", "Transport"), "gojek": ("Pengeluaran", "Transport"), "goride": ("Pengeluaran", "Transport"),
+    " grab ": ("Pengeluaran", "Transport"), " krl ": ("Pengeluaran", "Transport"), " mrt ": ("Pengeluaran", "Transport"),
+    "transjakarta": ("Pengeluaran", "Transport"), "taksi": ("Pengeluaran", "Transport"), "kereta": ("Pengeluaran", "Transport"),
+    "tokopedia": ("Pengeluaran", "Belanja"), "shopee": ("Pengeluaran", "Belanja"), "lazada": ("Pengeluaran", "Belanja"),
+    "indomaret": ("Pengeluaran", "Belanja"), "alfamart": ("Pengeluaran", "Belanja"), "supermarket": ("Pengeluaran", "Belanja"),
+    "belanja": ("Pengeluaran", "Belanja"),
+    "netflix": ("Pengeluaran", "Hiburan"), "spotify": ("Pengeluaran", "Hiburan"), "bioskop": ("Pengeluaran", "Hiburan"),
+    " cgv ": ("Pengeluaran", "Hiburan"), " xxi ": ("Pengeluaran", "Hiburan"), "konser": ("Pengeluaran", "Hiburan"),
+    "game": ("Pengeluaran", "Hiburan"),
+    "tabungan": ("Pengeluaran", "Tabungan"), "deposito": ("Pengeluaran", "Tabungan"), "reksadana": ("Pengeluaran", "Tabungan"),
+    "investasi": ("Pengeluaran", "Tabungan"),
+}
+
+# Regex rules for patterns a keyword cannot express, tried after the keywords
+CATEGORY_PATTERNS = [
+    (re.compile(r" (tarik tunai|atm) "), ("Pengeluaran", "Lainnya")),
+    (re.compile(r" (bunga|cashback|refund) "), ("Pendapatan", "Bonus")),
+    (re.compile(r" (top ?up|isi ulang) (gopay|ovo|dana|shopeepay) "), ("Pengeluaran", "Lainnya")),
+]
+
+# Label used when no rule matches and nothing has been learned yet
+DEFAULT_LABEL = ("Pengeluaran", "Lainnya")
+
+# Number of hashed n-gram features and the n-gram sizes (in characters)
+N_FEATURES = 2 ** 16
+NGRAM_SIZES = (3, 4)
+
+non_letter_pattern = re.compile(r"[^a-z]+")
+
+# Function to normalize a description for matching: lowercase letters only, single spaces, padded
+def normalize_description(text):
+    return " " + non_letter_pattern.sub(" ", str(text).lower()).strip() + " "
+
+# Function to hash the character n-grams of many (normalized, ASCII) texts at once.
+# Returns (text positions, feature ids), one pair per n-gram occurrence.
+def hashed_ngrams(texts, n_features=N_FEATURES, sizes=NGRAM_SIZES):
+    if not len(texts):
+        return np.array([], dtype="int64"), np.array([], dtype="int64")
+    # All texts in one byte buffer, separated by 0 bytes
+    buffer = np.frombuffer("\0".join(texts).encode("ascii", "ignore"), dtype=np.uint8).astype(np.uint64)
+    separators = np.cumsum(buffer == 0)
+    bits = int(np.log2(n_features))
+    rows, cols = [], []
+    for size in sizes:
+        count = len(buffer) - size + 1
+        if count <= 0:
+            continue
+        code = np.zeros(count, dtype=np.uint64)
+        for offset in range(size):
+            code = (code << np.uint64(8)) | buffer[offset:offset + count]
+        # Windows that contain a separator span two texts
+        inside = separators[size - 1:] == separators[:count] if size > 1 else np.ones(count, dtype=bool)
+        inside &= buffer[:count] != 0
+        code = (code[inside] | np.uint64(size << 56)) * np.uint64(0x9E3779B97F4A7C15)
+        rows.append(separators[:count][inside].astype("int64"))
+        cols.append((code >> np.uint64(64 - bits)).astype("int64"))
+    return np.concatenate(rows), np.concatenate(cols)
+
+# Suggests (Kategori, Sub-kategori) from Deskripsi. Three layers are tried in order:
+# descriptions already labeled in the ledger (exact match), keyword/regex rules, and a
+# multinomial Naive Bayes model over hashed character n-grams trained on the ledger.
+# add()/remove() update all counts in place, so user corrections are learned at once.
+class TransactionCategorizer:
+    def __init__(self, df=None, alpha=0.1):
+        self.alpha = alpha
+        self.labels = []
+        self.label_ids = {}
+        self.label_counts = np.zeros(0)
+        self.feature_counts = np.zeros((0, N_FEATURES))
+        # Normalized description -> {label id: rows}
+        self.text_labels = {}
+        self.matcher = KeywordMatcher({keyword: (len(keyword), label) for keyword, label in CATEGORY_KEYWORDS.items()})
+        self._memo = {}
+        self._log_likelihood = None
+        if df is not None:
+            self.add(df)
+
+    def _label_id(self, label):
+        if label not in self.label_ids:
+            self.label_ids[label] = len(self.labels)
+            self.labels.append(label)
+            self.label_counts = np.append(self.label_counts, 0.0)
+            self.feature_counts = np.vstack([self.feature_counts, np.zeros((1, N_FEATURES))])
+        return self.label_ids[label]
+
+    # Learn (sign=1) or unlearn (sign=-1) the labeled rows of a ledger frame
+    def add(self, df, sign=1):
+        if df is None or df.empty:
+            return
+        labeled = pd.DataFrame({
+            "text": df["Deskripsi"].map(normalize_description),
+            "category": df["Kategori"].astype(object),
+            "subcategory": df["Sub-kategori"].astype(object),
+        })
+        labeled = labeled[labeled["category"].notna() & labeled["subcategory"].notna()
+                          & (labeled["category"] != "") & (labeled["subcategory"] != "")]
+        if labeled.empty:
+            return
+        groups = labeled.groupby(["text", "category", "subcategory"]).size().reset_index(name="rows")
+        label_ids = np.array([self._label_id(label) for label in zip(groups["category"], groups["subcategory"])])
+        weights = sign * groups["rows"].to_numpy(dtype="float64")
+
+        np.add.at(self.label_counts, label_ids, weights)
+        positions, features = hashed_ngrams(groups["text"].tolist())
+        np.add.at(self.feature_counts, (label_ids[positions], features), weights[positions])
+
+        for text, label_id, rows in zip(groups["text"], label_ids, weights):
+            counts = self.text_labels.setdefault(text, {})
+            counts[label_id] = counts.get(label_id, 0) + rows
+            if counts[label_id] <= 0:
+                del counts[label_id]
+                if not counts:
+                    del self.text_labels[text]
+        self._memo = {}
+        self._log_likelihood = None
+
+    def remove(self, df):
+        self.add(df, sign=-1)
+
+    # Label from the keyword and regex rules, or None
+    def _rule_label(self, text):
+        matches = self.matcher.find(text)
+        if matches:
+            # The longest keyword is the most specific ("grabfood" over " grab ")
+            return max(matches)[1]
+        for pattern, label in CATEGORY_PATTERNS:
+            if pattern.search(text):
+                return label
+        return None
+
+    # Most likely label ids of normalized texts under the Naive Bayes model
+    def _model_label_ids(self, texts):
+        if self._log_likelihood is None:
+            smoothed = np.maximum(self.feature_counts, 0) + self.alpha
+            self._log_likelihood = np.log(smoothed) - np.log(smoothed.sum(axis=1, keepdims=True))
+        positions, features = hashed_ngrams(texts)
+        with np.errstate(divide="ignore"):
+            scores = np.log(np.maximum(self.label_counts, 0))[:, None] + np.zeros((1, len(texts)))
+        for label_id in range(len(self.labels)):
+            scores[label_id] += np.bincount(positions, weights=self._log_likelihood[label_id, features],
+                                            minlength=len(texts))
+        return scores.argmax(axis=0)
+
+    # Labels of distinct normalized texts that are not memoized yet
+    def _predict_texts(self, texts):
+        labels = {}
+        unresolved = []
+        for text in texts:
+            counts = self.text_labels.get(text)
+            if counts:
+                labels[text] = self.labels[max(counts, key=counts.get)]
+                continue
+            label = self._rule_label(text)
+            if label is not None:
+                labels[text] = label
+            else:
+                unresolved.append(text)
+        if unresolved:
+            if self.label_counts.sum() > 0:
+                label_ids = self._model_label_ids(unresolved)
+                labels.update((text, self.labels[label_id]) for text, label_id in zip(unresolved, label_ids))
+            else:
+                labels.update((text, DEFAULT_LABEL) for text in unresolved)
+        return labels
+
+    # Suggested Kategori and Sub-kategori for a sequence of descriptions; every distinct
+    # description is normalized and predicted once, and predictions are memoized
+    def predict(self, descriptions):
+        descriptions = pd.Series(descriptions).fillna("").astype(str)
+        codes, uniques = pd.factorize(descriptions)
+        texts = [normalize_description(text) for text in uniques]
+        missing = list({text for text in texts if text not in self._memo})
+        if missing:
+            self._memo.update(self._predict_texts(missing))
+        labels = [self._memo[text] for text in texts]
+        categories = np.array([label[0] for label in labels], dtype=object)
+        subcategories = np.array([label[1] for label in labels], dtype=object)
+        return pd.DataFrame({
+            "Kategori": categories[codes] if len(codes) else [],
+            "Sub-kategori": subcategories[codes] if len(codes) else [],
+        }, index=descriptions.index)
+
+    # Fill blank Kategori/Sub-kategori cells of a ledger frame with suggestions
+    def fill_missing(self, df):
+        blank = {col: df[col].isna() | (df[col].astype(object) == "") for col in ["Kategori", "Sub-kategori"]}
+        rows = blank["Kategori"] | blank["Sub-kategori"]
+        if not rows.any():
+            return df
+        predicted = self.predict(df.loc[rows, "Deskripsi"])
+        df = df.copy()
+        for col, is_blank in blank.items():
+            values = df[col].astype(object)
+            values[is_blank] = predicted[col].reindex(df.index)[is_blank]
+            df[col] = values.astype("category")
+        return df
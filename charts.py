@@ -0,0 +1,199 @@
+# Import necessary libraries
+import calendar
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from app_utils import (
+    get_store, get_monthly_aggregates, get_daily_aggregates, get_cashflow,
+    get_income_vs_expense, get_subcategory_breakdown
+)
+from forecast import get_forecast
+
+# Finished figures are cached in the ledger store, keyed on the ledger (and budget) version
+# and the selected period, so switching between periods already shown is a lookup.
+# Streamlit serializes a cached Figure without validating it again; callers must not modify it.
+
+DAY_NAMES = ["Sen", "Sel", "Rab", "Kam", "Jum", "Sab", "Min"]
+
+# Function to get a figure from the cache, building it when the ledger or budget changed
+def cached_figure(name, period, builder, with_budget=False):
+    store = get_store()
+    # The key is taken before the data is read, so a concurrent write only causes a rebuild
+    key = (store.ledger_key(), store.budget_key() if with_budget else None)
+    return store.cached(f"figure:{name}:{period}", key, builder)
+
+# Function to build the calendar grid of one month: spending per cell (NaN outside the
+# month) and the cell labels ("day<br>amount"), with weeks as rows starting on Monday
+def calendar_grid(daily_spending, year, month):
+    first_weekday, n_days = calendar.monthrange(year, month)
+    n_weeks = (first_weekday + n_days + 6) // 7
+    days = np.arange(n_weeks * 7) - first_weekday + 1
+    in_month = (days >= 1) & (days <= n_days)
+
+    per_day = np.zeros(n_days + 1)
+    spent_days = daily_spending.index.to_numpy(dtype="int64")
+    per_day[spent_days] = daily_spending.to_numpy(dtype="float64")
+    values = np.where(in_month, per_day[np.clip(days, 0, n_days)], np.nan)
+
+    amounts = pd.Series(np.nan_to_num(values)).map("{:,.0f}".format).to_numpy(dtype=object)
+    labels = np.where(in_month, days.astype(str).astype(object) + "<br>" + amounts, "")
+    return values.reshape(n_weeks, 7), labels.reshape(n_weeks, 7)
+
+# Function to build the calendar heatmap of the daily spending of one month ("YYYY-MM")
+def calendar_heatmap_figure(month):
+    def build():
+        month_start = pd.Timestamp(month)
+        daily_df = get_daily_aggregates()
+        month_daily = daily_df[
+            (daily_df["date"] >= month_start) &
+            (daily_df["date"] < month_start + pd.offsets.MonthBegin(1)) &
+            (daily_df["category"] == "Pengeluaran")
+        ]
+        daily_spending = month_daily.groupby(month_daily["date"].dt.day)["amount"].sum()
+        heatmap, labels = calendar_grid(daily_spending, month_start.year, month_start.month)
+
+        # Labels are drawn by the trace itself (text/texttemplate), not one annotation per day
+        fig = go.Figure(
+            data=go.Heatmap(
+                z=heatmap,
+                x=DAY_NAMES,
+                y=[f"Minggu ke-{i+1}" for i in range(len(heatmap))],
+                text=labels,
+                texttemplate="%{text}",
+                textfont=dict(size=10, color="black"),
+                colorscale="Blues",
+                colorbar=dict(title="Jumlah (Rp)"),
+                hoverinfo="z"
+            )
+        )
+        fig.update_layout(
+            xaxis=dict(side="top"),
+            height=600, width=600
+        )
+        return fig
+    return cached_figure("calendar", month, build)
+
+# Function to build the budget vs actual spending bars of one month
+def budget_vs_actual_figure(month, categories, budget):
+    def build():
+        df = get_monthly_aggregates()
+        month_df = df[(df["month"] == month) & (df["category"] == "Pengeluaran")]
+        actual = month_df.groupby("subcategory", observed=True)["amount"].sum().reindex(categories, fill_value=0)
+        compare_df = pd.DataFrame({
+            "Kategori": categories,
+            "Realisasi": actual.values,
+            "Anggaran": pd.Series(budget, dtype="float64").reindex(categories, fill_value=0).values
+        })
+        compare_df = compare_df.melt(id_vars="Kategori", value_vars=["Realisasi", "Anggaran"], var_name="Tipe", value_name="Jumlah")
+        return px.bar(
+            compare_df, x="Kategori", y="Jumlah", color="Tipe", barmode="group",
+            color_discrete_sequence=["#e43434", "#328ed0"])
+    return cached_figure("budget_vs_actual", (month, tuple(categories)), build, with_budget=True)
+
+# Function to build the spending distribution pie of one month (None without spending)
+def spending_pie_figure(month, categories):
+    def build():
+        df = get_monthly_aggregates()
+        month_df = df[(df["month"] == month) & (df["category"] == "Pengeluaran")]
+        spend_dist = month_df.groupby("subcategory", observed=True)["amount"].sum().reindex(categories, fill_value=0)
+        spend_dist_nonzero = spend_dist[spend_dist > 0]
+        if spend_dist_nonzero.sum() <= 0:
+            return None
+        fig = px.pie(
+            names=spend_dist_nonzero.index,
+            values=spend_dist_nonzero.values,
+            color_discrete_sequence=px.colors.diverging.RdBu_r
+        )
+        fig.update_traces(textposition='inside', textinfo='percent+label')
+        fig.update_layout(height=400, width=400, legend_title="Sub-kategori",)
+        return fig
+    return cached_figure("spending_pie", (month, tuple(categories)), build)
+
+# Function to get the monthly aggregates of one year
+def year_aggregates(year):
+    df = get_monthly_aggregates()
+    return df[df["date"].dt.year == year]
+
+# Function to build the monthly cashflow line of one year
+def cashflow_figure(year):
+    def build():
+        monthly_cashflow = get_cashflow(year_aggregates(year), freq="M")["cashflow"]
+        monthly_cashflow.index = [i.strftime("%B %Y") for i in monthly_cashflow.index]
+        return px.line(
+            x=monthly_cashflow.index,
+            y=monthly_cashflow.values,
+            markers=True,
+            labels={"x": "Bulan", "y": "Alur Kas (Rp)"},
+            color_discrete_sequence=px.colors.diverging.RdBu_r
+        )
+    return cached_figure("cashflow", year, build)
+
+# Function to build the income vs expense bars per month of one year
+def income_vs_expense_figure(year):
+    def build():
+        monthly_summary = get_income_vs_expense(year_aggregates(year), freq="M")
+        monthly_summary = monthly_summary.rename(columns={"date": "Bulan", "category": "Kategori", "amount": "Jumlah"})
+        fig = px.bar(
+            monthly_summary,
+            x="Bulan",
+            y="Jumlah",
+            color="Kategori",
+            barmode="group",
+            color_discrete_map={"Pendapatan": "#328ed0", "Pengeluaran": "#e43434"}
+        )
+        fig.update_layout(
+            xaxis_title="Bulan",
+            yaxis_title="Jumlah (Rp)",
+            legend_title="Kategori",
+        )
+        return fig
+    return cached_figure("income_vs_expense", year, build)
+
+# Function to build the spending per subcategory and month of one year (None without spending)
+def subcategory_breakdown_figure(year, categories):
+    def build():
+        spend_by_cat = get_subcategory_breakdown(year_aggregates(year), categories, freq="M")
+        if spend_by_cat.empty:
+            return None
+        spend_by_cat.index = [i.strftime("%B %Y") for i in spend_by_cat.index]
+        spend_by_cat_reset = spend_by_cat.reset_index().rename(columns={"index": "Bulan"})
+        spend_by_cat_melt = spend_by_cat_reset.melt(id_vars="Bulan", var_name="Kategori", value_name="Jumlah")
+        fig = px.bar(
+            spend_by_cat_melt,
+            x="Bulan",
+            y="Jumlah",
+            color="Kategori",
+            barmode="group",
+            title=f"Distribusi Pengeluaran Tahunan berdasarkan Kategori - {year}",
+            color_discrete_sequence=px.colors.sequential.RdBu_r
+        )
+        fig.update_layout(xaxis_title="Bulan", yaxis_title="Jumlah (Rp)", legend_title="Sub-kategori",)
+        return fig
+    return cached_figure("subcategory_breakdown", (year, tuple(categories)), build)
+
+# Function to build the income and expense history (last history_months months) with the
+# forecast of the next horizon months as dashed lines (None without complete months)
+def forecast_figure(categories, horizon=6, history_months=24):
+    def build():
+        result = get_forecast(categories, horizon)
+        if result["history"].empty:
+            return None
+        history = result["history"].iloc[-history_months:]
+        # The forecast line starts at the last actual month so both lines connect
+        projected = pd.concat([history.iloc[-1:], result["forecast"]])
+        colors = {"Pendapatan": "#328ed0", "Pengeluaran": "#e43434"}
+        fig = go.Figure()
+        for name, color in colors.items():
+            fig.add_trace(go.Scatter(
+                x=history.index.to_timestamp(), y=history[name], name=name,
+                mode="lines+markers", line=dict(color=color)
+            ))
+            fig.add_trace(go.Scatter(
+                x=projected.index.to_timestamp(), y=projected[name], name=f"{name} (proyeksi)",
+                mode="lines+markers", line=dict(color=color, dash="dash")
+            ))
+        fig.update_layout(xaxis_title="Bulan", yaxis_title="Jumlah (Rp)", legend_title="Kategori")
+        return fig
+    return cached_figure("forecast", (tuple(categories), horizon, history_months), build)
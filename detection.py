@@ -0,0 +1,177 @@
+# Import necessary libraries
+import numpy as np
+import pandas as pd
+
+from app_utils import get_store
+from categorizer import normalize_description
+
+# Recurring payments: at least RECURRING_MIN_COUNT payments (on different days) whose gaps
+# stay within the tolerance of one of these intervals ({name: (days, tolerance in days)})
+RECURRING_MIN_COUNT = 3
+RECURRING_INTERVALS = {"Mingguan": (7, 1), "Dua Mingguan": (14, 2), "Bulanan": (30, 3), "Tahunan": (365, 7)}
+RECURRING_MIN_REGULAR_SHARE = 0.75
+
+# Likely duplicates: same normalized description, dates at most DUPLICATE_DAYS apart and
+# amounts at most DUPLICATE_AMOUNT_SHARE apart
+DUPLICATE_DAYS = 2
+DUPLICATE_AMOUNT_SHARE = 0.01
+
+# Outliers: amounts compared with the previous OUTLIER_WINDOW transactions of the same
+# subcategory (at least OUTLIER_MIN_PERIODS); flagged when the z-score reaches OUTLIER_Z
+# and the amount is above the upper IQR fence (Q3 + OUTLIER_IQR_FACTOR * IQR). Amounts
+# are compared on a log scale, since spending varies by factors rather than by sums.
+OUTLIER_WINDOW = 100
+OUTLIER_MIN_PERIODS = 20
+OUTLIER_Z = 3.0
+OUTLIER_IQR_FACTOR = 1.5
+
+# Every detector sorts the ledger once by a hashed key and compares each row with its
+# neighbour (duplicates then with the first row of the run), so a full scan costs
+# O(n log n) instead of comparing all pairs.
+
+# Function to get an integer code per distinct normalized description. Descriptions that
+# only differ in case, punctuation or spacing share a code, and with ignore_digits=True
+# also those that only differ in numbers (reference numbers of recurring payments).
+def description_codes(df, ignore_digits=True):
+    codes, uniques = pd.factorize(df["Deskripsi"].fillna("").astype(str))
+    if ignore_digits:
+        normalized = pd.Series([normalize_description(text) for text in uniques])
+    else:
+        normalized = pd.Series(uniques).str.lower().str.replace(r"[\W_]+", " ", regex=True).str.strip()
+    return pd.factorize(normalized)[0][codes]
+
+# Function to find recurring payments: the same description, or the same amount in the same
+# subcategory, paid at a regular interval. One row per series found.
+def detect_recurring(df):
+    columns = ["Deskripsi", "Sub-kategori", "Jumlah (Rp)", "Periode", "Interval (hari)", "Transaksi", "Terakhir", "Berikutnya"]
+    expenses = df[(df["Kategori"] == "Pengeluaran").to_numpy()]
+    if expenses.empty:
+        return pd.DataFrame(columns=columns)
+    days = expenses["Tanggal"].to_numpy().astype("datetime64[D]").astype("int64")
+    amounts = expenses["Jumlah (Rp)"].to_numpy(dtype="float64")
+    subcategory_codes = pd.factorize(expenses["Sub-kategori"])[0]
+    amount_codes = pd.factorize(np.round(amounts))[0]
+    keys = {
+        "description": description_codes(expenses),
+        "amount": pd.factorize(amount_codes * (subcategory_codes.max() + 2) + subcategory_codes + 1)[0],
+    }
+
+    found = []
+    for kind, key in keys.items():
+        # One row per (key, day): several payments on one day count once
+        order = np.lexsort((days, key))
+        key_sorted, days_sorted = key[order], days[order]
+        first_of_day = np.r_[True, (key_sorted[1:] != key_sorted[:-1]) | (days_sorted[1:] != days_sorted[:-1])]
+        order, key_sorted, days_sorted = order[first_of_day], key_sorted[first_of_day], days_sorted[first_of_day]
+
+        # Gaps between consecutive days of the same key
+        same_key = np.r_[False, key_sorted[1:] == key_sorted[:-1]]
+        gaps = pd.Series(np.where(same_key, np.diff(days_sorted, prepend=days_sorted[0]), np.nan))
+        groups = gaps.groupby(key_sorted)
+        summary = pd.DataFrame({"count": groups.size(), "interval": groups.median()})
+        summary = summary[summary["count"] >= RECURRING_MIN_COUNT]
+        for period, (interval, tolerance) in RECURRING_INTERVALS.items():
+            candidates = summary.index[(summary["interval"] - interval).abs() <= tolerance]
+            if not len(candidates):
+                continue
+            in_candidate = np.isin(key_sorted, candidates) & same_key
+            regular = (np.abs(gaps.to_numpy() - interval) <= tolerance)[in_candidate]
+            share = pd.Series(regular).groupby(key_sorted[in_candidate]).mean()
+            regular_keys = share.index[share >= RECURRING_MIN_REGULAR_SHARE]
+            selected = np.isin(key_sorted, regular_keys)
+            rows = expenses.iloc[order[selected]]
+            grouped = rows.assign(key=key_sorted[selected]).groupby("key")
+            series = grouped.agg(**{
+                "Deskripsi": ("Deskripsi", "last"),
+                "Sub-kategori": ("Sub-kategori", "last"),
+                "Jumlah (Rp)": ("Jumlah (Rp)", "median"),
+                "Transaksi": ("Deskripsi", "size"),
+                "Terakhir": ("Tanggal", "max"),
+            })
+            if kind == "amount":
+                series["Deskripsi"] = "(berbagai)"
+            series["Periode"] = period
+            series["Interval (hari)"] = summary["interval"].reindex(series.index)
+            series["Berikutnya"] = series["Terakhir"] + pd.to_timedelta(series["Interval (hari)"], unit="D")
+            found.append(series)
+    if not found:
+        return pd.DataFrame(columns=columns)
+    recurring = pd.concat(found, ignore_index=True)[columns]
+    # A series found by description and by amount is listed once
+    recurring = recurring.drop_duplicates(subset=["Sub-kategori", "Periode", "Terakhir"])
+    return recurring.sort_values("Berikutnya").reset_index(drop=True)
+
+# Function to find likely duplicates: rows with the same normalized description, dates at
+# most DUPLICATE_DAYS and amounts at most DUPLICATE_AMOUNT_SHARE from the first row of
+# their group. Returns the rows of every group of
+# two or more with its number in "Grup" (by date within a group).
+def detect_duplicates(df):
+    if df.empty:
+        return df.assign(Grup=pd.Series(dtype="int64"))
+    key = description_codes(df, ignore_digits=False)
+    days = df["Tanggal"].to_numpy().astype("datetime64[D]").astype("int64")
+    amounts = df["Jumlah (Rp)"].to_numpy(dtype="float64")
+    # Sorted by description, then amount, then date: near-equal amounts end up next to each other
+    order = np.lexsort((days, amounts, key))
+    key, days, amounts = key[order], days[order], amounts[order]
+
+    # Rows close to the row before them form candidate runs
+    close = np.r_[False,
+                  (key[1:] == key[:-1])
+                  & (np.abs(days[1:] - days[:-1]) <= DUPLICATE_DAYS)
+                  & (np.abs(amounts[1:] - amounts[:-1]) <= DUPLICATE_AMOUNT_SHARE * np.maximum(amounts[1:], amounts[:-1]))]
+    group = np.cumsum(~close)
+    # Within a run a row joins the group only when it is close to the first row of the
+    # group, so daily purchases of the same amount do not chain into one long group
+    next_group = group[-1] + 1
+    anchor = 0
+    for i in np.flatnonzero(close):
+        if not close[i - 1]:
+            anchor = i - 1
+        if (abs(days[i] - days[anchor]) <= DUPLICATE_DAYS
+                and amounts[i] - amounts[anchor] <= DUPLICATE_AMOUNT_SHARE * amounts[i]):
+            group[i] = group[anchor]
+        else:
+            group[i], next_group, anchor = next_group, next_group + 1, i
+    sizes = np.bincount(group)
+    in_group = sizes[group] >= 2
+    duplicates = df.iloc[order[in_group]].copy()
+    duplicates["Grup"] = pd.factorize(group[in_group])[0] + 1
+    return duplicates.sort_values(["Grup", "Tanggal"], kind="stable")
+
+# Function to find outlier amounts per subcategory: each amount is compared with the
+# rolling mean/std (z-score) and quartiles (IQR fence) of the transactions before it
+def detect_outliers(df):
+    expenses = df[(df["Kategori"] == "Pengeluaran").to_numpy()].sort_values("Tanggal", kind="stable")
+    if expenses.empty:
+        return expenses.assign(**{"Z-score": pd.Series(dtype="float64"), "Batas Wajar": pd.Series(dtype="float64")})
+    amounts = np.log1p(expenses["Jumlah (Rp)"].astype("float64").clip(lower=0))
+    # The window of each row ends at the row before it, so an outlier does not hide itself
+    previous = amounts.groupby(expenses["Sub-kategori"], observed=True).shift(1)
+    rolling = previous.groupby(expenses["Sub-kategori"], observed=True).rolling(
+        OUTLIER_WINDOW, min_periods=OUTLIER_MIN_PERIODS
+    )
+    stats = pd.DataFrame({
+        "mean": rolling.mean(), "std": rolling.std(),
+        "q1": rolling.quantile(0.25), "q3": rolling.quantile(0.75),
+    }).reset_index(level=0, drop=True).reindex(expenses.index)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = (amounts - stats["mean"]) / stats["std"]
+    fence = stats["q3"] + OUTLIER_IQR_FACTOR * (stats["q3"] - stats["q1"])
+    flagged = (z >= OUTLIER_Z) & (amounts > fence)
+    outliers = expenses[flagged.to_numpy()].copy()
+    outliers["Z-score"] = z[flagged].round(1)
+    outliers["Batas Wajar"] = np.expm1(fence[flagged]).round(0)
+    return outliers.sort_values("Tanggal", ascending=False)
+
+# Function to run all detectors on the current ledger (cached until the ledger changes)
+def get_transaction_review():
+    store = get_store()
+    def review():
+        df = store.load()
+        return {
+            "recurring": detect_recurring(df),
+            "duplicates": detect_duplicates(df),
+            "outliers": detect_outliers(df),
+        }
+    return store.cached("review", store.ledger_key(), review)
@@ -0,0 +1,247 @@
+# Import necessary libraries
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+
+from app_utils import DATA_DIR, get_transformers_pipeline
+
+# Sentence embedding model (any transformers feature-extraction model works). When
+# EMBEDDING_MODEL_DIR points to a downloaded model directory it is loaded from there
+# without network access.
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+EMBEDDING_MODEL_DIR = os.environ.get("EMBEDDING_MODEL_DIR")
+
+# Dynamic batching: texts are sorted by length and batched so that one batch holds at most
+# EMBEDDING_BATCH_CHARS characters of padded input (short texts go in large batches)
+EMBEDDING_BATCH_CHARS = 8192
+EMBEDDING_MAX_BATCH = 256
+# Longer texts are truncated by the tokenizer
+EMBEDDING_MAX_TOKENS = 128
+
+# Embeddings are cached on disk by model, pooling and text hash. Changing the pooling
+# changes every vector, so its name is part of the key.
+EMBEDDING_CACHE_PATH = os.path.join(DATA_DIR, "embeddings.db")
+EMBEDDING_POOLING = "masked-mean"
+
+# Function to get the cache key of a text: hash of the model, the pooling and the text
+def text_key(model, text):
+    return hashlib.sha1(f"{model}\0{EMBEDDING_POOLING}\0{text}".encode("utf-8")).hexdigest()
+
+# Function to split texts (sorted by length) into batches of at most max_chars padded characters
+def dynamic_batches(texts, max_chars=EMBEDDING_BATCH_CHARS, max_batch=EMBEDDING_MAX_BATCH):
+    batch = []
+    for text in texts:
+        # Texts are sorted, so the padded size of the batch is set by its last text
+        if batch and (len(batch) + 1) * max(len(text), 1) > max_chars or len(batch) == max_batch:
+            yield batch
+            batch = []
+        batch.append(text)
+    if batch:
+        yield batch
+
+# Persistent embedding cache in SQLite (float32 vectors stored as blobs)
+class EmbeddingCache:
+    def __init__(self, path=EMBEDDING_CACHE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    # Cached vectors of the given keys: {key: vector}
+    def get_many(self, keys):
+        found = {}
+        with self.lock, self._connect() as conn:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update((key, np.frombuffer(vector, dtype=np.float32)) for key, vector in rows)
+        return found
+
+    def put_many(self, vectors):
+        with self.lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in vectors.items()]
+            )
+
+    def clear(self):
+        with self.lock, self._connect() as conn:
+            conn.execute("DELETE FROM embeddings")
+
+# The model is loaded once per process and shared by all sessions
+_pipelines = {}
+_pipeline_lock = threading.Lock()
+
+# Function to get the feature-extraction pipeline of a model (a local directory is used offline)
+def get_embedding_pipeline(model=EMBEDDING_MODEL, model_dir=EMBEDDING_MODEL_DIR):
+    source = model_dir or model
+    with _pipeline_lock:
+        if source not in _pipelines:
+            pipeline = get_transformers_pipeline()
+            model_kwargs = {"local_files_only": True} if model_dir else {}
+            print(f"Loading embedding model {source}")  # Debug print
+            _pipelines[source] = pipeline("feature-extraction", model=source, tokenizer=source,
+                                          model_kwargs=model_kwargs)
+        return _pipelines[source]
+
+# Sentence embeddings of descriptions: identical texts are embedded once, cached vectors
+# are reused and the rest goes through the model in dynamic batches. Vectors are mean
+# pooled over each text's own tokens (padding masked out) and L2-normalized, so a dot
+# product is the cosine similarity.
+class EmbeddingService:
+    def __init__(self, model=EMBEDDING_MODEL, model_dir=EMBEDDING_MODEL_DIR, cache=None):
+        self.model = model
+        self.model_dir = model_dir
+        self.cache = cache
+        self.dim = None
+        self.stats = {"texts": 0, "cache_hits": 0, "embedded": 0, "batches": 0, "seconds": 0.0}
+
+    # Texts embedded per second by the model (cache hits excluded)
+    def throughput(self):
+        return self.stats["embedded"] / self.stats["seconds"] if self.stats["seconds"] else 0.0
+
+    # The pipeline's tokenizer and model are called directly: the pipeline returns the padded
+    # hidden states of a batch and drops max_length, so pooling uses the attention mask here
+    def _embed_batch(self, pipe, batch):
+        inputs = pipe.tokenizer(batch, padding=True, truncation=True, max_length=EMBEDDING_MAX_TOKENS,
+                                return_tensors=pipe.framework)
+        mask = np.asarray(inputs["attention_mask"], dtype=np.float32)[:, :, None]
+        if pipe.framework == "pt":
+            import torch
+            with torch.no_grad():
+                hidden = pipe.model(**inputs.to(pipe.device))[0].float().cpu().numpy()
+        else:
+            hidden = np.asarray(pipe.model(**inputs)[0], dtype=np.float32)
+        # Mean over the text's own tokens only, so a vector does not depend on its batch
+        vectors = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1)
+
+    # Embeddings of many texts as a (len(texts), dim) float32 array
+    def embed(self, texts):
+        texts = pd.Series(texts, dtype=object).fillna("").astype(str).str.strip()
+        codes, uniques = pd.factorize(texts)
+        self.stats["texts"] += len(texts)
+        keys = [text_key(self.model, text) for text in uniques]
+        vectors = self.cache.get_many(keys) if self.cache is not None else {}
+        self.stats["cache_hits"] += len(vectors)
+
+        missing = sorted((text for text, key in zip(uniques, keys) if key not in vectors), key=len)
+        if missing:
+            pipe = get_embedding_pipeline(self.model, self.model_dir)
+            started = time.time()
+            new_vectors = {}
+            for batch in dynamic_batches(missing):
+                for text, vector in zip(batch, self._embed_batch(pipe, batch)):
+                    new_vectors[text_key(self.model, text)] = vector
+                self.stats["batches"] += 1
+            self.stats["seconds"] += time.time() - started
+            self.stats["embedded"] += len(missing)
+            if self.cache is not None:
+                self.cache.put_many(new_vectors)
+            vectors.update(new_vectors)
+
+        if not len(uniques):
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        matrix = np.stack([vectors[key] for key in keys])
+        self.dim = matrix.shape[1]
+        return matrix[codes]
+
+# Nearest-neighbour lookup of ledger rows by description meaning. Every distinct
+# description is embedded once. add()/remove() only queue the changed rows, so saves
+# (which call them under the ledger's write lock) never run the model; the queue is
+# embedded by catch_up() on the next lookup, under the index's own lock.
+class SimilarityIndex:
+    def __init__(self, service, df=None):
+        self.service = service
+        self.text_ids = {}
+        self.rows = []
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.text_by_row = {}
+        self.pending = []
+        self.pending_lock = threading.Lock()
+        self.update_lock = threading.Lock()
+        if df is not None:
+            self.add(df)
+
+    # Queue ledger rows to add (their index labels are the row ids)
+    def add(self, df):
+        if not df.empty:
+            with self.pending_lock:
+                self.pending.append(("add", df))
+
+    # Queue ledger rows to remove (by their row ids)
+    def remove(self, df):
+        if not df.empty:
+            with self.pending_lock:
+                self.pending.append(("remove", df))
+
+    # Apply the queued changes in order. A change leaves the queue only once applied, so
+    # a failing model is retried on the next lookup.
+    def catch_up(self):
+        with self.update_lock:
+            while self.pending:
+                op, df = self.pending[0]
+                if op == "add":
+                    self._add_rows(df)
+                else:
+                    self._remove_rows(df)
+                with self.pending_lock:
+                    self.pending.pop(0)
+
+    def _add_rows(self, df):
+        texts = df["Deskripsi"].fillna("").astype(str).str.strip()
+        new_texts = [text for text in texts.unique() if text not in self.text_ids]
+        if new_texts:
+            new_vectors = self.service.embed(new_texts)
+            for text in new_texts:
+                self.text_ids[text] = len(self.rows)
+                self.rows.append(set())
+            self.vectors = new_vectors if not len(self.vectors) else np.vstack([self.vectors, new_vectors])
+        for row_id, text in zip(df.index, texts):
+            self.rows[self.text_ids[text]].add(row_id)
+            self.text_by_row[row_id] = self.text_ids[text]
+
+    def _remove_rows(self, df):
+        for row_id in df.index:
+            text_id = self.text_by_row.pop(row_id, None)
+            if text_id is not None:
+                self.rows[text_id].discard(row_id)
+
+    # Row ids and similarities of the rows whose descriptions are closest to the query,
+    # at most k distinct descriptions (all rows of each)
+    def most_similar(self, query, k=10):
+        self.catch_up()
+        with self.update_lock:
+            live = np.array([bool(rows) for rows in self.rows], dtype=bool)
+            if not live.any():
+                return np.array([], dtype="int64"), np.array([], dtype=np.float32)
+            scores = self.vectors @ self.service.embed([query])[0]
+            scores[~live] = -np.inf
+            k = min(k, int(live.sum()))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            row_ids = [(row_id, scores[text_id]) for text_id in top for row_id in sorted(self.rows[text_id])]
+            return (np.array([row_id for row_id, _ in row_ids], dtype="int64"),
+                    np.array([score for _, score in row_ids], dtype=np.float32))
+
+# Shared service (created on first use)
+_service = None
+
+# Function to get the embedding service of the configured model with the shared disk cache
+def get_embedding_service():
+    global _service
+    with _pipeline_lock:
+        if _service is None:
+            _service = EmbeddingService(cache=EmbeddingCache())
+        return _service
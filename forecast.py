@@ -0,0 +1,116 @@
+# Import necessary libraries
+import numpy as np
+import pandas as pd
+
+from app_utils import get_store, get_monthly_aggregates, get_cashflow, get_monthly_spending
+
+# Forecasting models, tried on every series
+FORECAST_MODELS = ["ewma", "seasonal_naive", "linear"]
+
+# Months in a season (seasonal-naive repeats the value of the same month last year)
+SEASON_MONTHS = 12
+# Smoothing factor of the EWMA model (weight of the newest month)
+EWMA_ALPHA = 0.3
+# Number of most recent months used to backtest the models, and the training months needed first
+BACKTEST_MONTHS = 12
+MIN_TRAIN_MONTHS = 3
+
+# Every series is a column of one (months x series) matrix, so each model below fits all
+# series (income, expense and every subcategory) at once with array operations.
+
+# Function to get the dense monthly series: Pendapatan, Pengeluaran and spending per
+# subcategory, one row per month from the first to the last month in the aggregates
+def monthly_series(df, subcategories):
+    spending = get_monthly_spending(df, subcategories)
+    cashflow = get_cashflow(df, freq="M").reindex(spending.index, fill_value=0.0)
+    series = pd.concat([cashflow[["income", "expense"]], spending], axis=1)
+    return series.rename(columns={"income": "Pendapatan", "expense": "Pengeluaran"})
+
+# Function to get the EWMA level after every month (months x series)
+def ewma_levels(values, alpha=EWMA_ALPHA):
+    return pd.DataFrame(values).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+
+# Function to get the least-squares line through every prefix of the series at once:
+# intercept and slope (months x series) fitted on months 0..t, from cumulative sums
+def prefix_trends(values):
+    t = np.arange(len(values), dtype="float64")[:, None]
+    n = t + 1
+    sum_t = np.cumsum(t, axis=0)
+    sum_tt = np.cumsum(t * t, axis=0)
+    sum_y = np.cumsum(values, axis=0)
+    sum_ty = np.cumsum(t * values, axis=0)
+    denominator = n * sum_tt - sum_t ** 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(denominator > 0, (n * sum_ty - sum_t * sum_y) / denominator, 0.0)
+    intercept = (sum_y - slope * sum_t) / n
+    return intercept, slope
+
+# Function to get the one-step-ahead prediction of every model for every month:
+# {model: (months x series)}, row t predicted from months before t (row 0 is NaN)
+def one_step_predictions(values, alpha=EWMA_ALPHA, season=SEASON_MONTHS):
+    n = len(values)
+    predictions = {model: np.full(values.shape, np.nan) for model in FORECAST_MODELS}
+    if n < 2:
+        return predictions
+    predictions["ewma"][1:] = ewma_levels(values, alpha)[:-1]
+    seasonal = predictions["seasonal_naive"]
+    seasonal[1:] = values[:-1]
+    if n > season:
+        seasonal[season:] = values[:-season]
+    intercept, slope = prefix_trends(values)
+    months = np.arange(1, n, dtype="float64")[:, None]
+    predictions["linear"][1:] = np.maximum(intercept[:-1] + slope[:-1] * months, 0)
+    return predictions
+
+# Function to forecast the next horizon months of every series with one model (horizon x series)
+def model_forecast(values, model, horizon, alpha=EWMA_ALPHA, season=SEASON_MONTHS):
+    n = len(values)
+    steps = np.arange(horizon)
+    if model == "ewma":
+        return np.repeat(ewma_levels(values, alpha)[-1:], horizon, axis=0)
+    if model == "seasonal_naive":
+        if n < season:
+            return np.repeat(values[-1:], horizon, axis=0)
+        return values[n - season + steps % season]
+    intercept, slope = prefix_trends(values)
+    return np.maximum(intercept[-1] + slope[-1] * (n + steps)[:, None], 0)
+
+# Function to forecast monthly income, expense and spending per subcategory from the monthly
+# aggregates. Every model is backtested on the last backtest_months months (one month ahead)
+# and each series is forecast with the model that had the lowest mean absolute error there.
+# Returns {"history", "forecast": months x series, "errors": series x model, "models": series -> model}.
+def forecast_monthly(df, subcategories, horizon=3, backtest_months=BACKTEST_MONTHS, alpha=EWMA_ALPHA):
+    history = monthly_series(df, subcategories) if not df.empty else pd.DataFrame()
+    if not history.empty:
+        # The current month is not complete yet, so it is forecast rather than used
+        history = history[history.index < pd.Timestamp.today().to_period("M")]
+    if history.empty:
+        return {"history": history, "forecast": pd.DataFrame(), "errors": pd.DataFrame(), "models": pd.Series(dtype=object)}
+    values = history.to_numpy(dtype="float64")
+    n = len(values)
+
+    # Backtest on the months that have enough training data before them
+    first = max(MIN_TRAIN_MONTHS, n - backtest_months)
+    predictions = one_step_predictions(values, alpha)
+    errors = pd.DataFrame(
+        {model: np.abs(predictions[model][first:] - values[first:]).mean(axis=0) if first < n else np.nan
+         for model in FORECAST_MODELS},
+        index=history.columns
+    )
+    # Without a backtest the EWMA model (first) is used
+    models = errors.fillna(np.inf).idxmin(axis=1)
+
+    forecasts = {model: model_forecast(values, model, horizon, alpha) for model in FORECAST_MODELS}
+    chosen = np.array([FORECAST_MODELS.index(model) for model in models])
+    stacked = np.stack([forecasts[model] for model in FORECAST_MODELS])
+    months = pd.period_range(history.index[-1] + 1, periods=horizon, freq="M", name="date")
+    forecast = pd.DataFrame(stacked[chosen, :, np.arange(len(chosen))].T, index=months, columns=history.columns)
+    return {"history": history, "forecast": forecast, "errors": errors, "models": models}
+
+# Function to get the forecast of the current ledger (cached until the ledger changes)
+def get_forecast(subcategories, horizon=3):
+    store = get_store()
+    return store.cached(
+        f"forecast:{tuple(subcategories)}:{horizon}", store.ledger_key(),
+        lambda: forecast_monthly(get_monthly_aggregates(), subcategories, horizon)
+    )
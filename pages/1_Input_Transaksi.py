@@ -3,15 +3,23 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import streamlit as st
-from app_utils import load_csv, save_to_csv
+from app_utils import (
+    append_transactions, start_import_job, get_import_job, cancel_import_job, get_ledger_index,
+    get_transaction_page, save_editor_changes, get_ledger_version, suggest_categories, show_budget_alerts, budget_alert_message,
+    expected_cols
+)
 import pandas as pd
 
 st.header("💸 Input Transaksi")
+show_budget_alerts()
 tabs = st.tabs([' ➕ Transaksi Baru', ' 📄 Riwayat Transaksi'])
 
 CATEGORIES = ["Pendapatan", "Pengeluaran"]
 SUBCATEGORIES = ["Gaji", "Bonus", "Makanan", "Transport", "Belanja", "Hiburan", "Tabungan", "Lainnya"]
 PAYMENT = ["Cash", "Debit", "Credit", "E-Wallet"]
+PAGE_SIZES = [25, 50, 100, 250]
+# Option that lets the categorizer fill Kategori/Sub-kategori from the description
+AUTO_OPTION = "(Otomatis)"
 
 with tabs[0]:
     st.subheader("Input Manual Transaksi")
@@ -20,11 +28,11 @@ with tabs[0]:
         with col1:
             date = st.date_input("Tanggal")
             amount = st.number_input("Jumlah (Rp)", min_value=0.0, step=1000.0)
-            category = st.selectbox("Kategori", CATEGORIES)
+            category = st.selectbox("Kategori", CATEGORIES + [AUTO_OPTION])
         with col2:
             description = st.text_input("Deskripsi")
             payment_method = st.selectbox("Metode Pembayaran", PAYMENT)
-            subcategory = st.selectbox("Sub-kategori", SUBCATEGORIES)
+            subcategory = st.selectbox("Sub-kategori", SUBCATEGORIES + [AUTO_OPTION])
         note = st.text_area("Catatan (opsional)", placeholder="Tambahkan catatan jika perlu")
 
         submit_button = st.form_submit_button("💾 Simpan Transaksi")
@@ -33,6 +41,13 @@ with tabs[0]:
                 st.error("Mohon isi deskripsi transaksi!")
             else:
                 try:
+                    auto_categorized = AUTO_OPTION in (category, subcategory)
+                    if auto_categorized:
+                        suggestion = suggest_categories([description]).iloc[0]
+                        if category == AUTO_OPTION:
+                            category = suggestion["Kategori"]
+                        if subcategory == AUTO_OPTION:
+                            subcategory = suggestion["Sub-kategori"]
                     new_row = {
                         "Tanggal": pd.to_datetime(date).strftime("%Y-%m-%d"),
                         "Deskripsi": description,
@@ -43,16 +58,12 @@ with tabs[0]:
                         "Catatan": note if note else ""
                     }
                     
-                    # Load existing data
-                    df = load_csv()
-                    
-                    # Add new row
-                    new_df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-                    
-                    # Save and refresh
-                    if save_to_csv(new_df):
+                    # Append to the transaction journal and refresh
+                    if append_transactions([new_row]):
                         st.session_state.need_refresh = True
                         st.success("✅ Transaksi berhasil disimpan!")
+                        if auto_categorized:
+                            st.info(f"Kategori otomatis: {category} / {subcategory}")
                     else:
                         st.error("Gagal menyimpan transaksi. Silakan coba lagi.")
                 except Exception as e:
@@ -81,41 +92,60 @@ with tabs[0]:
 
     uploaded_file = st.file_uploader("Pilih file CSV", type=["csv"])
     if uploaded_file is not None:
-        uploaded_df = pd.read_csv(uploaded_file)
-        expected_cols = [
-            "Tanggal", "Deskripsi", "Jumlah (Rp)", "Kategori",
-            "Sub-kategori", "Metode Pembayaran", "Catatan"
-        ]
-        uploaded_df.columns = [col.strip() for col in uploaded_df.columns]
-        missing_cols = [col for col in expected_cols if col not in uploaded_df.columns]
-        if missing_cols:
-            st.error(f"Kolom berikut tidak ditemukan di file CSV: {missing_cols}")
+        # Streamlit reruns the script with the same upload; start one import job per file
+        if st.session_state.get("imported_file_id") != uploaded_file.file_id:
+            st.session_state.import_job_id = start_import_job(uploaded_file).id
+            st.session_state.imported_file_id = uploaded_file.file_id
+
+    # The import runs in the background; this fragment polls its progress while it runs
+    import_job = get_import_job(st.session_state.get("import_job_id"))
+    import_running = import_job is not None and not import_job.finished
+
+    @st.fragment(run_every=1 if import_running else None)
+    def show_import_job():
+        job = get_import_job(st.session_state.get("import_job_id"))
+        if job is None:
+            return
+        if not job.finished:
+            st.progress(job.progress(), text=(
+                f"Mengimpor {job.name}: {job.rows_processed} baris diproses, "
+                f"{job.rows_rejected} tidak valid, {job.duplicates} duplikat"
+            ))
+            if st.button("✖️ Batalkan Impor"):
+                cancel_import_job(job.id)
+            return
+        if import_running:
+            # Rerun the whole page so the history shows the imported rows
+            st.rerun()
+        if job.status == "done":
+            result = job.result
+            st.success(f"✅ {result['imported']} transaksi dari CSV berhasil diunggah dan disimpan!")
+            if result["duplicates"]:
+                st.info(f"{result['duplicates']} baris duplikat dilewati.")
+            if result["rejected"]:
+                st.warning(f"{result['rejected']} baris tidak valid dilewati:")
+                st.dataframe(result["bad_rows"], use_container_width=True)
+            for alert in result["alerts"]:
+                st.warning(budget_alert_message(alert))
+        elif job.status == "cancelled":
+            st.info("Impor dibatalkan, tidak ada transaksi yang disimpan.")
         else:
-            uploaded_df = uploaded_df[expected_cols]
-            uploaded_df["Tanggal"] = pd.to_datetime(uploaded_df["Tanggal"], errors="coerce")
-            uploaded_df = uploaded_df.dropna(subset=["Tanggal"])
-            existing_df = load_csv()
-            combined_df = pd.concat([existing_df, uploaded_df], ignore_index=True)
-            combined_df = combined_df.drop_duplicates()
-            save_to_csv(combined_df)
-            st.success("✅ Data dari CSV berhasil diunggah dan disimpan!")
+            st.error(job.error)
+
+    show_import_job()
 
 with tabs[1]:
     st.write("Daftar Transaksi:")
     
-    # Load and prepare data
-    df = load_csv()
+    # Date-sorted ledger index shared by all sessions
+    ledger_index = get_ledger_index()
     
-    if df.empty:
+    if len(ledger_index) == 0:
         st.info("Belum ada transaksi yang ditemukan.")
     else:
-        # Convert and clean date data
-        df["Tanggal"] = pd.to_datetime(df["Tanggal"])
-        df = df.sort_values("Tanggal", ascending=False).reset_index(drop=True)
-        
         # Set min and max dates
-        min_date = df["Tanggal"].min().date()
-        max_date = df["Tanggal"].max().date()
+        min_date = ledger_index.min_date().date()
+        max_date = ledger_index.max_date().date()
 
         # Date filter columns
         col1, col2 = st.columns([2, 2])
@@ -131,45 +161,68 @@ with tabs[1]:
         # Filter columns
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            kategori_filter = st.selectbox("Filter Kategori", ["Semua"] + sorted(df["Kategori"].dropna().unique().tolist()))
+            kategori_filter = st.selectbox("Filter Kategori", ["Semua"] + ledger_index.options("Kategori"))
         with col2:
-            subkategori_filter = st.selectbox("Filter Sub-kategori", ["Semua"] + sorted(df["Sub-kategori"].dropna().unique().tolist()))
+            subkategori_filter = st.selectbox("Filter Sub-kategori", ["Semua"] + ledger_index.options("Sub-kategori"))
         with col3:
-            metode_filter = st.selectbox("Filter Metode", ["Semua"] + sorted(df["Metode Pembayaran"].dropna().unique().tolist()))
+            metode_filter = st.selectbox("Filter Metode", ["Semua"] + ledger_index.options("Metode Pembayaran"))
         with col4:
             search = st.text_input("Cari Deskripsi")
 
-        # Apply filters
-        filtered_df = df.copy()
+        # Sorting and paging controls
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            sort_by = st.selectbox("Urutkan Berdasarkan", expected_cols)
+        with col2:
+            sort_order = st.selectbox("Urutan", ["Menurun", "Menaik"])
+        with col3:
+            page_size = st.selectbox("Baris per Halaman", PAGE_SIZES, index=1)
+        with col4:
+            page = st.number_input("Halaman", min_value=1, value=1, step=1)
 
-        # Apply date filter
-        filtered_df = filtered_df[
-            (filtered_df["Tanggal"].dt.date >= start_date) &
-            (filtered_df["Tanggal"].dt.date <= end_date)
-        ]
-        
-        # Apply category filters
-        if kategori_filter != "Semua":
-            filtered_df = filtered_df[filtered_df["Kategori"] == kategori_filter]
-        if subkategori_filter != "Semua":
-            filtered_df = filtered_df[filtered_df["Sub-kategori"] == subkategori_filter]
-        if metode_filter != "Semua":
-            filtered_df = filtered_df[filtered_df["Metode Pembayaran"] == metode_filter]
-        
-        # Apply search filter
-        if search:
-            filtered_df = filtered_df[filtered_df["Deskripsi"].str.contains(search, case=False, na=False)]
+        # Apply date, category and search filters (binary search on dates, integer compares
+        # on categories, search index for descriptions/notes); only the current page is
+        # sent to the browser
+        filters = {
+            "Kategori": kategori_filter,
+            "Sub-kategori": subkategori_filter,
+            "Metode Pembayaran": metode_filter,
+        }
+        active_filters = {col: value for col, value in filters.items() if value != "Semua"}
+        # Version of the ledger this page is read from (checked again when edits are saved)
+        ledger_version = get_ledger_version()
+        page_df, total_rows = get_transaction_page(
+            start_date, end_date, active_filters, search,
+            sort_by=sort_by, ascending=sort_order == "Menaik",
+            page=page, page_size=page_size
+        )
         
         # Show data in editor
-        if len(filtered_df) == 0:
+        if total_rows == 0:
             st.info("Tidak ada transaksi dalam rentang tanggal yang dipilih.")
         else:
-            # Show data editor with current filters applied
-            edited_df = st.data_editor(
-                filtered_df,
+            total_pages = (total_rows + page_size - 1) // page_size
+            page = min(page, total_pages)
+            first_row = (page - 1) * page_size + 1
+            st.caption(f"Menampilkan {first_row}-{first_row + len(page_df) - 1} dari {total_rows} transaksi (halaman {page} dari {total_pages})")
+
+            # Editor state belongs to one page view; a new view (or a save) starts with a clean editor
+            editor_key = "data_editor-" + "-".join(map(str, [
+                start_date, end_date, sorted(active_filters.items()), search,
+                sort_by, sort_order, page_size, page, st.session_state.get("editor_generation", 0)
+            ]))
+            # Edits are positions in the page as shown when they were made, so they are saved against
+            # that version; without pending edits the editor follows the current version (this
+            # session's own saves and imports included)
+            editor_state = st.session_state.get(editor_key, {})
+            if not any(editor_state.get(changes) for changes in ("edited_rows", "added_rows", "deleted_rows")):
+                st.session_state[editor_key + "-version"] = ledger_version
+            editor_version = st.session_state[editor_key + "-version"]
+            st.data_editor(
+                page_df,
                 num_rows="dynamic",
                 use_container_width=True,
-                key="data_editor",
+                key=editor_key,
                 column_order=[
                     "Tanggal", "Deskripsi", "Jumlah (Rp)", "Kategori",
                     "Sub-kategori", "Metode Pembayaran", "Catatan"
@@ -181,8 +234,12 @@ with tabs[1]:
             with col1:
                 if st.button("💾 Simpan Perubahan"):
                     try:
-                        save_to_csv(edited_df)
-                        st.success("✅ Perubahan berhasil disimpan!")
-                        st.rerun()
+                        # Only the rows changed in the editor are saved
+                        saved = save_editor_changes(page_df, st.session_state[editor_key], editor_version)
+                        # Saved or stale, the next run shows the current rows in a clean editor
+                        st.session_state.editor_generation = st.session_state.get("editor_generation", 0) + 1
+                        if saved:
+                            st.success("✅ Perubahan berhasil disimpan!")
+                            st.rerun()
                     except Exception as e:
-                        st.error(f"Gagal menyimpan perubahan: {str(e)}")
\ No newline at end of file
+                        st.error(f"Gagal menyimpan perubahan: {str(e)}")
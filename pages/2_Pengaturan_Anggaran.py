@@ -4,14 +4,19 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import streamlit as st
 import pandas as pd
-import requests
-import re
-from app_utils import load_csv, save_budget_csv, get_historical_average_by_category
+from app_utils import (
+    save_budget_csv, get_spending_stats, get_cashflow, get_monthly_aggregates, show_budget_alerts
+)
+from ai_utils import get_llm_client, LLMError
+from budget_parser import BudgetTableParser
+from forecast import get_forecast
 
-# Load OpenRouter API key from Streamlit secrets
+# Load OpenRouter API key (and optionally another endpoint URL) from Streamlit secrets
 api_key = st.secrets["openrouter"]["api_key"]
+api_url = st.secrets["openrouter"].get("url")
 
 st.header("🧮 Pengaturan Anggaran")
+show_budget_alerts()
 
 SUBCATEGORIES = ["Makanan", "Transport", "Belanja", "Hiburan", "Tabungan", "Lainnya"]
 category_map = {
@@ -20,104 +25,97 @@ category_map = {
     "savings": "Tabungan", "tabungan": "Tabungan", "other": "Lainnya", "misc": "Lainnya", "lainnya": "Lainnya"
 }
 
-# Load and preprocess transaction data safely
-transactions_df = load_csv()
-transactions_df = transactions_df.copy()  # avoid chained assignment warning
+# Options for the history window (None: all months)
+HISTORY_WINDOWS = {"Semua data": None, "12 bulan terakhir": 12, "6 bulan terakhir": 6, "3 bulan terakhir": 3}
 
-# Use .loc for explicit column assignment
-transactions_df.loc[:, "Tanggal"] = pd.to_datetime(transactions_df["Tanggal"], errors="coerce")
+# Monthly aggregates are maintained by the ledger store, so the statistics below cost the
+# same however many transactions there are
+monthly_df = get_monthly_aggregates()
 
-# Calculate historical averages
-historical_averages = get_historical_average_by_category(transactions_df, SUBCATEGORIES, months_back=100)
+history_window = st.selectbox("Data Historis", list(HISTORY_WINDOWS))
+months_back = HISTORY_WINDOWS[history_window]
+
+# Monthly spending per subcategory (months without spending count as 0)
+spending_stats = get_spending_stats(monthly_df, SUBCATEGORIES, months_back)
+
+# Next month's income and spending per subcategory, forecast from the whole history with
+# the model that predicted each series best in a backtest
+next_month = get_forecast(SUBCATEGORIES)["forecast"].head(1)
 
 monthly_income = 0
-if not transactions_df.empty:
-    # Copy filtered df to avoid warnings
-    pendapatan_df = transactions_df[transactions_df["Kategori"] == "Pendapatan"].copy()
-    if not pendapatan_df.empty:
-        income_per_month = (
-            pendapatan_df.groupby(pendapatan_df["Tanggal"].dt.to_period("M"))["Jumlah (Rp)"]
-            .sum()
-        )
-        if not income_per_month.empty:
-            monthly_income = income_per_month.mean()
+if not next_month.empty:
+    monthly_income = next_month["Pendapatan"].iloc[0]
+elif not monthly_df.empty:
+    # Average over the months that had income, from the monthly aggregates
+    income_per_month = get_cashflow(monthly_df, freq="M")["income"]
+    if months_back is not None:
+        income_per_month = income_per_month.iloc[-months_back:]
+    income_per_month = income_per_month[income_per_month > 0]
+    if not income_per_month.empty:
+        monthly_income = income_per_month.mean()
 
 savings_goal = st.number_input("Target Total Tabungan (Rp)", min_value=0, step=50000)
 free_text_goal = st.text_area("Catatan Tambahan (misal: 'kurangi pengeluaran makanan', 'nabung untuk liburan')")
 
 if st.button("Hasilkan Anggaran AI"):
-    with st.spinner("Lagi dibikinin anggaran nya nih...sabar dikit, biar akhir bulan nggak drama! "):
-        history_str = "\n".join([f"- {cat}: Rp{amount:,.0f}" for cat, amount in historical_averages.items()])
-        prompt = (
-            f"Kamu adalah asisten keuangan. Ini adalah pengeluaran rata-rata bulanan berdasarkan seluruh data historis:\n{history_str}\n\n"
-            f"Pendapatan bulan ini diperkirakan Rp{monthly_income:,.0f}. Target tabungan: Rp{savings_goal:,.0f}.\n"
-            f"{free_text_goal}\n"
-            "Buat anggaran bulanan yang masuk akal. Hanya gunakan kategori: Makanan, Transport, Belanja, Hiburan, Tabungan, Lainnya."
-            "Jawab dalam format tabel markdown dan gunakan Bahasa Indonesia."
+    history_str = "\n".join([
+        f"- {cat}: rata-rata Rp{row['mean']:,.0f}, median Rp{row['median']:,.0f}"
+        + (f", perkiraan bulan depan Rp{next_month[cat].iloc[0]:,.0f}" if not next_month.empty else "")
+        for cat, row in spending_stats.iterrows()
+    ])
+    history_label = "seluruh data historis" if months_back is None else f"{months_back} bulan terakhir"
+    prompt = (
+        f"Kamu adalah asisten keuangan. Ini adalah pengeluaran bulanan berdasarkan {history_label}:\n{history_str}\n\n"
+        f"Pendapatan bulan ini diperkirakan Rp{monthly_income:,.0f}. Target tabungan: Rp{savings_goal:,.0f}.\n"
+        f"{free_text_goal}\n"
+        "Buat anggaran bulanan yang masuk akal. Hanya gunakan kategori: Makanan, Transport, Belanja, Hiburan, Tabungan, Lainnya."
+        "Jawab dalam format tabel markdown dan gunakan Bahasa Indonesia."
+    )
+
+    st.subheader("🧠 Rekomendasi Anggaran dari AI")
+    parser = BudgetTableParser(SUBCATEGORIES, category_map)
+    parsed_table = st.empty()
+
+    budget_inputs = {cat: 0.0 for cat in SUBCATEGORIES}
+    budget_percentages = {cat: None for cat in SUBCATEGORIES}
+
+    # Every parsed row goes into the budget inputs right away, before the reply is complete
+    def apply_rows(rows):
+        if not rows:
+            return
+        for category, amount, percent in rows:
+            budget_inputs[category] = amount
+            budget_percentages[category] = percent
+        st.session_state.budget_inputs = budget_inputs
+        st.session_state.budget_percentages = budget_percentages
+        parsed_table.dataframe(
+            pd.DataFrame({"Kategori": list(parser.budget), "Anggaran (Rp)": list(parser.budget.values())}),
+            hide_index=True
         )
-        
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://personal-finance-assistance.streamlit.app"
-        }
-        data = {
-            "model": 'deepseek/deepseek-chat-v3-0324',
-            "messages": [{"role": "user", "content": prompt}]
-        }
-
-        response = requests.post("https://openrouter.ai/api/v1/chat/completions", headers=headers, json=data)
-
-    if response.status_code == 200:
-        ai_text = response.json()['choices'][0]['message']['content']
-        st.subheader("🧠 Rekomendasi Anggaran dari AI")
-
-        parsed_budget = {}
-        parsed_percentages = {}
-        for line in ai_text.splitlines():
-            if re.match(r"\s*\|", line) and not re.match(r"\s*\|[\s\-|]+\|", line):
-                cols = [c.strip(" *") for c in line.strip().split("|")[1:-1]]
-                if len(cols) >= 2:
-                    category = cols[0].lower()
-                    amount_str = next((c for c in cols[1:] if re.search(r"\d", c)), None)
-                    percent_str = next((c for c in cols[1:] if "%" in c), None)
-                    matched = None
-                    for allowed in SUBCATEGORIES:
-                        if allowed.lower() in category:
-                            matched = allowed
-                            break
-                    if not matched:
-                        for key in category_map:
-                            if key in category:
-                                matched = category_map[key]
-                                break
-                    if not matched or not amount_str:
-                        continue
-                    try:
-                        amount = float(amount_str.replace("$", "").replace(",", "").replace("%", "").strip())
-                        parsed_budget[matched] = amount
-                        if percent_str:
-                            try:
-                                parsed_percentages[matched] = float(percent_str.replace("%", "").replace(",", "").strip())
-                            except ValueError:
-                                parsed_percentages[matched] = None
-                        else:
-                            parsed_percentages[matched] = None
-                    except ValueError:
-                        continue
-
-        if parsed_budget:
-            st.session_state.budget_inputs = {cat: parsed_budget.get(cat, 0.0) for cat in SUBCATEGORIES}
-            st.session_state.budget_percentages = {cat: parsed_percentages.get(cat, None) for cat in SUBCATEGORIES}
+
+    # Tokens are rendered as they stream in; timeouts, retries and the response cache are handled by the client
+    def stream_reply():
+        for piece in get_llm_client(api_key, api_url).chat_stream(prompt):
+            apply_rows(parser.feed(piece))
+            yield piece
+        apply_rows(parser.close())
+
+    try:
+        with st.spinner("Lagi dibikinin anggaran nya nih...sabar dikit, biar akhir bulan nggak drama! "):
+            st.write_stream(stream_reply())
+        ai_error = None
+    except LLMError as e:
+        ai_error = e
+
+    if ai_error is None:
+        if parser.budget:
             st.success("Anggaran dari AI sudah jadi! Ubah sesuai kebutuhan dan simpan ya.")
         else:
             st.warning("⚠️ Oops! Anggaran dari AI belum bisa dibaca. Silakan revisi atau coba lagi.")
-            st.write("Status code:", response.status_code)
-            st.write("Response:", response.text)
     else:
         st.error("❌ Oops! AI lagi bingung dan belum bisa menjawab. Coba ulangi beberapa saat lagi ya.")
-        st.write("Status code:", response.status_code)
-        st.write("Response:", response.text)
+        st.write("Status code:", ai_error.status_code)
+        st.write("Response:", ai_error.text or str(ai_error))
 
 if "budget_inputs" in st.session_state:
     st.markdown("✏️ Nilai di bawah bisa kamu sesuaikan sebelum disimpan:")
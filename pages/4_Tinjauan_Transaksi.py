@@ -0,0 +1,83 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import streamlit as st
+from app_utils import apply_transaction_changes, get_ledger_version, show_budget_alerts, find_similar_transactions
+from detection import get_transaction_review
+
+st.header("🔎 Tinjauan Transaksi")
+show_budget_alerts()
+
+# Number of duplicate groups shown at once
+MAX_DUPLICATE_GROUPS = 200
+display_cols = ["Tanggal", "Deskripsi", "Jumlah (Rp)", "Kategori", "Sub-kategori", "Metode Pembayaran"]
+
+# Version of the ledger the review is read from (checked again when duplicates are deleted)
+ledger_version = get_ledger_version()
+# Detection runs once per ledger version and is shared by all sessions
+review = get_transaction_review()
+
+tabs = st.tabs(["🔁 Transaksi Rutin", "👯 Kemungkinan Duplikat", "📈 Nominal Tidak Wajar", "🧭 Transaksi Serupa"])
+
+with tabs[0]:
+    st.write("Pembayaran dengan deskripsi atau nominal yang sama dalam interval yang teratur:")
+    recurring = review["recurring"]
+    if recurring.empty:
+        st.info("Belum ada transaksi rutin yang terdeteksi.")
+    else:
+        st.dataframe(recurring, use_container_width=True, hide_index=True)
+
+with tabs[1]:
+    st.write("Transaksi dengan deskripsi sama, tanggal berdekatan dan nominal hampir sama:")
+    duplicates = review["duplicates"]
+    if duplicates.empty:
+        st.info("Tidak ada kemungkinan duplikat.")
+    else:
+        n_groups = duplicates["Grup"].max()
+        shown = duplicates[duplicates["Grup"] <= MAX_DUPLICATE_GROUPS][["Grup"] + display_cols]
+        st.caption(f"{len(duplicates)} transaksi dalam {n_groups} grup"
+                   + (f" (menampilkan {MAX_DUPLICATE_GROUPS} grup pertama)" if n_groups > MAX_DUPLICATE_GROUPS else ""))
+        # Nothing is marked for deletion until the user picks the rows
+        shown.insert(0, "Hapus", False)
+        edited = st.data_editor(
+            shown,
+            use_container_width=True,
+            hide_index=True,
+            disabled=["Grup"] + display_cols,
+            key=f"duplicates-{ledger_version}"
+        )
+        to_delete = edited.index[edited["Hapus"].to_numpy()]
+        if st.button(f"🗑️ Hapus {len(to_delete)} Transaksi Terpilih", disabled=len(to_delete) == 0):
+            if apply_transaction_changes(deleted=list(to_delete), expected_version=ledger_version):
+                st.success(f"✅ {len(to_delete)} transaksi duplikat berhasil dihapus!")
+                st.rerun()
+
+with tabs[2]:
+    st.write("Pengeluaran yang jauh di atas kebiasaan sub-kategorinya (dibanding transaksi sebelumnya):")
+    outliers = review["outliers"]
+    if outliers.empty:
+        st.info("Tidak ada nominal yang tidak wajar.")
+    else:
+        st.dataframe(outliers[display_cols + ["Z-score", "Batas Wajar"]], use_container_width=True, hide_index=True)
+
+with tabs[3]:
+    st.write("Cari transaksi dengan deskripsi yang maknanya mirip (bukan hanya kata yang sama):")
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        query = st.text_input("Deskripsi", placeholder="misal: ngopi di kafe")
+    with col2:
+        n_similar = st.number_input("Jumlah deskripsi", min_value=1, max_value=50, value=10, step=1)
+    if query:
+        try:
+            # The embedding model is loaded on the first search
+            with st.spinner("Mencari transaksi serupa..."):
+                similar = find_similar_transactions(query, k=int(n_similar))
+        except Exception as e:
+            print(f"Error finding similar transactions: {str(e)}")  # Debug print
+            st.error(f"Pencarian transaksi serupa belum bisa dijalankan: {str(e)}")
+        else:
+            if similar.empty:
+                st.info("Belum ada transaksi untuk dibandingkan.")
+            else:
+                st.dataframe(similar[display_cols + ["Kemiripan"]], use_container_width=True, hide_index=True)